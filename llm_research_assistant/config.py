@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 from dotenv import load_dotenv
@@ -12,6 +13,131 @@ class Settings(BaseSettings):
     MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME")
     # MONGODB_DB_NAME: str = os.getenv("MONGODB_DB_NAME", "mydatabase")
 
+    # Motor connection pool, per uvicorn worker process (unset = driver default)
+    MONGODB_MAX_POOL_SIZE: int = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+    MONGODB_MIN_POOL_SIZE: int = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+    MONGODB_MAX_IDLE_TIME_MS: Optional[int] = os.getenv("MONGODB_MAX_IDLE_TIME_MS")
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS: Optional[int] = os.getenv(
+        "MONGODB_WAIT_QUEUE_TIMEOUT_MS"
+    )
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS: int = int(
+        os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "30000")
+    )
+    MONGODB_CONNECT_TIMEOUT_MS: int = int(
+        os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "20000")
+    )
+    MONGODB_SOCKET_TIMEOUT_MS: Optional[int] = os.getenv("MONGODB_SOCKET_TIMEOUT_MS")
+    # Wire compression, in order of preference; unavailable codecs are skipped
+    MONGODB_COMPRESSORS: str = os.getenv("MONGODB_COMPRESSORS", "zstd,snappy,zlib")
+    MONGODB_READ_PREFERENCE: str = os.getenv("MONGODB_READ_PREFERENCE", "primary")
+
+    # get_current_user cache (per worker); invalidated on user update/delete
+    USER_CACHE_MAX_SIZE: int = int(os.getenv("USER_CACHE_MAX_SIZE", "10000"))
+    USER_CACHE_TTL_SECONDS: float = float(os.getenv("USER_CACHE_TTL_SECONDS", "60"))
+    # If > 0, tokens younger than this are trusted for name/email without a lookup
+    AUTH_TRUST_CLAIMS_SECONDS: int = int(os.getenv("AUTH_TRUST_CLAIMS_SECONDS", "0"))
+
+    # Token lifetimes: short-lived access JWTs renewed with rotating refresh tokens
+    ACCESS_TOKEN_MINUTES: int = int(os.getenv("ACCESS_TOKEN_MINUTES", "30"))
+    REFRESH_TOKEN_DAYS: int = int(os.getenv("REFRESH_TOKEN_DAYS", "30"))
+
+    # Documents fetched per round trip when streaming a user's data export
+    EXPORT_BATCH_SIZE: int = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+    # Password hashing: bcrypt cost, hashing threads and extra calls allowed to wait
+    BCRYPT_ROUNDS: int = int(os.getenv("BCRYPT_ROUNDS", "12"))
+    PASSWORD_HASH_WORKERS: int = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+    PASSWORD_HASH_MAX_QUEUE: int = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+    # PDF text extraction (process pool size and pages handed to each worker)
+    PDF_EXTRACT_WORKERS: int = int(os.getenv("PDF_EXTRACT_WORKERS", "4"))
+    PDF_EXTRACT_PAGES_PER_TASK: int = int(os.getenv("PDF_EXTRACT_PAGES_PER_TASK", "25"))
+
+    # Bulk paper upload (files validated/hashed/stored at once, files per request)
+    BULK_UPLOAD_CONCURRENCY: int = int(os.getenv("BULK_UPLOAD_CONCURRENCY", "8"))
+    BULK_UPLOAD_MAX_FILES: int = int(os.getenv("BULK_UPLOAD_MAX_FILES", "500"))
+
+    # Direct-to-S3 uploads (largest accepted PDF, lifetime of the presigned POST)
+    DIRECT_UPLOAD_MAX_BYTES: int = int(
+        os.getenv("DIRECT_UPLOAD_MAX_BYTES", str(100 * 1024 * 1024))
+    )
+    DIRECT_UPLOAD_EXPIRES_IN: int = int(os.getenv("DIRECT_UPLOAD_EXPIRES_IN", "900"))
+    # Completed uploads are finalized only by upload worker processes (see
+    # services/upload_service.py), never in the API process
+    UPLOAD_WORKERS: int = int(os.getenv("UPLOAD_WORKERS", "2"))
+    # A claimed upload is retried after this long if its worker disappears
+    UPLOAD_LEASE_SECONDS: int = int(os.getenv("UPLOAD_LEASE_SECONDS", "900"))
+    UPLOAD_POLL_SECONDS: float = float(os.getenv("UPLOAD_POLL_SECONDS", "5"))
+    # Pending upload slots never completed are removed after this long
+    UPLOAD_SLOT_TTL_SECONDS: int = int(
+        os.getenv("UPLOAD_SLOT_TTL_SECONDS", str(24 * 60 * 60))
+    )
+
+    # JSON file overriding the academic email rules (see services/classifier.py)
+    ACADEMIC_RULES_FILE: Optional[str] = os.getenv("ACADEMIC_RULES_FILE")
+
+    # Gmail messages fetched per HTTP batch request (the API allows up to 100)
+    GMAIL_BATCH_SIZE: int = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+    # Cached Gmail clients per worker; tokens refresh this long before expiry
+    GMAIL_CLIENT_CACHE_SIZE: int = int(os.getenv("GMAIL_CLIENT_CACHE_SIZE", "1000"))
+    GMAIL_CLIENT_CACHE_TTL_SECONDS: float = float(
+        os.getenv("GMAIL_CLIENT_CACHE_TTL_SECONDS", "3600")
+    )
+    GMAIL_TOKEN_REFRESH_MARGIN_SECONDS: int = int(
+        os.getenv("GMAIL_TOKEN_REFRESH_MARGIN_SECONDS", "300")
+    )
+    # Gmail OAuth: Google's redirect target (/email/oauth/callback), where the
+    # browser is sent once connected (JSON reply if unset), and how long a
+    # started authorization stays valid
+    GOOGLE_OAUTH_REDIRECT_URI: Optional[str] = os.getenv("GOOGLE_OAUTH_REDIRECT_URI")
+    GMAIL_OAUTH_SUCCESS_URL: Optional[str] = os.getenv("GMAIL_OAUTH_SUCCESS_URL")
+    GMAIL_OAUTH_STATE_MINUTES: int = int(os.getenv("GMAIL_OAUTH_STATE_MINUTES", "10"))
+    # Email PDF attachments: largest accepted, and bytes kept in memory before
+    # a download spills to a temp file
+    EMAIL_ATTACHMENT_MAX_BYTES: int = int(
+        os.getenv("EMAIL_ATTACHMENT_MAX_BYTES", str(25 * 1024 * 1024))
+    )
+    EMAIL_ATTACHMENT_SPOOL_BYTES: int = int(
+        os.getenv("EMAIL_ATTACHMENT_SPOOL_BYTES", str(1024 * 1024))
+    )
+    # Threads running blocking Gmail API calls (shared by all users)
+    GMAIL_IO_WORKERS: int = int(os.getenv("GMAIL_IO_WORKERS", "16"))
+    # Email ingestion pipeline: concurrent workers per stage
+    INGEST_FETCH_CONCURRENCY: int = int(os.getenv("INGEST_FETCH_CONCURRENCY", "8"))
+    INGEST_STORE_CONCURRENCY: int = int(os.getenv("INGEST_STORE_CONCURRENCY", "4"))
+    INGEST_EXTRACT_CONCURRENCY: int = int(os.getenv("INGEST_EXTRACT_CONCURRENCY", "2"))
+
+    # In-memory pre-filter over the ingestion ledger (expected entries, error rate)
+    INGEST_LEDGER_BLOOM_CAPACITY: int = int(
+        os.getenv("INGEST_LEDGER_BLOOM_CAPACITY", "1000000")
+    )
+    INGEST_LEDGER_BLOOM_ERROR_RATE: float = float(
+        os.getenv("INGEST_LEDGER_BLOOM_ERROR_RATE", "0.01")
+    )
+
+    # Background ingestion scheduler (syncs every connected account periodically)
+    INGEST_SCHEDULER_ENABLED: bool = (
+        os.getenv("INGEST_SCHEDULER_ENABLED", "false").lower() == "true"
+    )
+    INGEST_SCHEDULER_WORKERS: int = int(os.getenv("INGEST_SCHEDULER_WORKERS", "4"))
+    INGEST_SYNC_INTERVAL_SECONDS: int = int(
+        os.getenv("INGEST_SYNC_INTERVAL_SECONDS", "900")
+    )
+    INGEST_MAX_MESSAGES: int = int(os.getenv("INGEST_MAX_MESSAGES", "30"))
+    # Attachments that failed are retried by later syncs this many times
+    INGEST_RETRY_MAX_ATTEMPTS: int = int(os.getenv("INGEST_RETRY_MAX_ATTEMPTS", "5"))
+    # A claimed account is retried after this long if its worker disappears
+    INGEST_LEASE_SECONDS: int = int(os.getenv("INGEST_LEASE_SECONDS", "600"))
+    INGEST_POLL_SECONDS: float = float(os.getenv("INGEST_POLL_SECONDS", "5"))
+    # Exponential backoff after failures and quota errors (base, cap)
+    INGEST_BACKOFF_SECONDS: int = int(os.getenv("INGEST_BACKOFF_SECONDS", "60"))
+    INGEST_BACKOFF_MAX_SECONDS: int = int(
+        os.getenv("INGEST_BACKOFF_MAX_SECONDS", "3600")
+    )
+
+    # Messages kept embedded in each chat document; full history is in chat_messages
+    CHAT_HOT_WINDOW: int = int(os.getenv("CHAT_HOT_WINDOW", "50"))
+
     class Config:
         env_file = "../.env"
 
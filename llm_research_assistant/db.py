@@ -1,14 +1,155 @@
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
 from llm_research_assistant.config import settings
+from llm_research_assistant.monitoring import pool_metrics
 import asyncio
 
-client = AsyncIOMotorClient(settings.MONGODB_URI)
+client = AsyncIOMotorClient(
+    settings.MONGODB_URI,
+    maxPoolSize=settings.MONGODB_MAX_POOL_SIZE,
+    minPoolSize=settings.MONGODB_MIN_POOL_SIZE,
+    maxIdleTimeMS=settings.MONGODB_MAX_IDLE_TIME_MS,
+    waitQueueTimeoutMS=settings.MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+    serverSelectionTimeoutMS=settings.MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+    connectTimeoutMS=settings.MONGODB_CONNECT_TIMEOUT_MS,
+    socketTimeoutMS=settings.MONGODB_SOCKET_TIMEOUT_MS,
+    compressors=settings.MONGODB_COMPRESSORS,
+    readPreference=settings.MONGODB_READ_PREFERENCE,
+    event_listeners=[pool_metrics],
+)
 db = client[settings.MONGODB_DB_NAME]
 
 users_collection = db["users"]
 papers_collection = db["papers"]
 chats_collection = db["chats"]
 email_ingestion_collection = db["email_ingestion"]
+paper_texts_collection = db["paper_texts"]  # extracted text, one doc per file_hash
+blobs_collection = db["blobs"]  # one doc per stored file, _id is the file_hash
+uploads_collection = db["uploads"]  # direct-to-S3 upload slots
+chat_messages_collection = db["chat_messages"]  # full chat history, one doc/message
+refresh_tokens_collection = db["refresh_tokens"]  # _id is the token's HMAC
+ingestion_ledger_collection = db["ingestion_ledger"]  # email attachments ingested
+
+
+# Every index the app relies on, by collection name. Applied at startup by
+# create_indexes(); util/check_indexes.py verifies the hot queries use them.
+INDEXES = {
+    "users": [
+        # Login, registration and profile updates all look users up by email
+        IndexModel([("email", ASCENDING)], unique=True),
+    ],
+    "papers": [
+        # One paper per (owner, file)
+        IndexModel([("owner_id", ASCENDING), ("file_hash", ASCENDING)], unique=True),
+        IndexModel([("file_hash", ASCENDING)]),
+        # Keyset pagination: owner_id equality then _id range/sort
+        IndexModel([("owner_id", ASCENDING), ("_id", ASCENDING)]),
+        # Paper search: ranked full text, and anchored-prefix type-ahead on titles
+        IndexModel(
+            [("title", TEXT), ("search_terms", TEXT)],
+            weights={"title": 10, "search_terms": 1},
+            name="paper_text_search",
+        ),
+        IndexModel([("title_terms", ASCENDING)]),
+    ],
+    "chats": [
+        # Chat list: an owner's chats, most recently updated first
+        IndexModel(
+            [("owner_id", ASCENDING), ("updated_at", DESCENDING), ("_id", DESCENDING)]
+        ),
+        # Export: an owner's chats in _id order
+        IndexModel([("owner_id", ASCENDING), ("_id", ASCENDING)]),
+    ],
+    "chat_messages": [
+        # Ordered history per chat; unique so concurrent appends never collide
+        IndexModel([("chat_id", ASCENDING), ("seq", ASCENDING)], unique=True),
+    ],
+    "email_ingestion": [
+        IndexModel([("user_id", ASCENDING)]),
+        # Scheduler picks the account that has waited longest for a sync
+        IndexModel([("next_run_at", ASCENDING)]),
+    ],
+    "ingestion_ledger": [
+        # One entry per ingested attachment; unique so re-runs cannot double up
+        IndexModel(
+            [
+                ("user_id", ASCENDING),
+                ("message_id", ASCENDING),
+                ("attachment_id", ASCENDING),
+            ],
+            unique=True,
+        ),
+        # Entries recorded since a process last loaded the user's ledger
+        IndexModel([("user_id", ASCENDING), ("created_at", ASCENDING)]),
+    ],
+    "refresh_tokens": [
+        # Expired refresh tokens are removed by MongoDB
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        # Revoke all of a user's sessions
+        IndexModel([("user_id", ASCENDING)]),
+    ],
+    "paper_texts": [
+        IndexModel([("file_hash", ASCENDING)], unique=True),
+    ],
+    "uploads": [
+        # Abandoned slots expire; expires_at is unset once an upload completes
+        IndexModel([("expires_at", ASCENDING)], expireAfterSeconds=0),
+        # Upload workers claim completed uploads whose lease has run out
+        IndexModel([("status", ASCENDING), ("lease_until", ASCENDING)]),
+    ],
+}
+
+# Indexes replaced in INDEXES, dropped by create_indexes() where still present
+DROPPED_INDEXES = {
+    # TTL on created_at also deleted finished uploads (and their paper_id)
+    "uploads": ["created_at_1"],
+}
+
+
+async def create_indexes():
+    """
+    Create the indexes in INDEXES (idempotent; existing ones are kept).
+
+    Failing to build a unique index raises: the app relies on them instead
+    of checking for duplicates (e.g. user emails), so it must not serve
+    without them. Other failures are only logged.
+    """
+    for collection_name, index_names in DROPPED_INDEXES.items():
+        existing = await db[collection_name].index_information()
+        for index_name in index_names:
+            if index_name in existing:
+                await db[collection_name].drop_index(index_name)
+    for collection_name, indexes in INDEXES.items():
+        try:
+            await db[collection_name].create_indexes(indexes)
+        except Exception as e:
+            print(f"Index creation failed for {collection_name}: {e}")
+            if any(index.document.get("unique") for index in indexes):
+                # e.g. duplicate emails blocking users.email: fix the data first
+                raise
+
+
+async def backfill_blobs():
+    """Create blob records for papers uploaded before reference counting."""
+    pipeline = [
+        {"$group": {"_id": "$file_hash", "pdf_url": {"$first": "$pdf_url"}}},
+        {
+            "$lookup": {
+                "from": "blobs",
+                "localField": "_id",
+                "foreignField": "_id",
+                "as": "blob",
+            }
+        },
+        {"$match": {"blob": {"$size": 0}}},
+    ]
+    async for group in papers_collection.aggregate(pipeline):
+        ref_count = await papers_collection.count_documents({"file_hash": group["_id"]})
+        await blobs_collection.update_one(
+            {"_id": group["_id"]},
+            {"$setOnInsert": {"pdf_url": group["pdf_url"], "ref_count": ref_count}},
+            upsert=True,
+        )
 
 
 async def test_mongodb():
@@ -22,6 +163,8 @@ async def test_mongodb():
 
 async def startup():
     await test_mongodb()
+    await create_indexes()
+    await backfill_blobs()
 
 
 # Call the function when running FastAPI
@@ -1,17 +1,46 @@
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 import jwt
+from llm_research_assistant.cache import TTLCache
+from llm_research_assistant.config import settings
 from llm_research_assistant.jwt import decode_access_token
 from llm_research_assistant.db import users_collection, db
 from bson import ObjectId
+from bson.errors import InvalidId
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 # We'll still use /auth/login, but we won't rely on the OAuth2 flow forms.
 
+# User documents by id (without password_hash), so most authenticated
+# requests cost a JWT verification plus a dict lookup.
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_MAX_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS
+)
+
+
+def invalidate_cached_user(user_id):
+    """Drop a user from this worker's cache after it is updated or deleted."""
+    user_cache.invalidate(str(user_id))
+
+
+def _user_from_claims(payload):
+    """Build the user from a fresh token's signed claims, or return None."""
+    window = settings.AUTH_TRUST_CLAIMS_SECONDS
+    if window <= 0 or "name" not in payload or "email" not in payload:
+        return None
+    if time.time() - payload.get("iat", 0) > window:
+        return None
+    return {
+        "_id": ObjectId(payload["sub"]),
+        "name": payload["name"],
+        "email": payload["email"],
+    }
+
 
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     """
-    Decode the JWT, fetch the user from DB, return it.
+    Decode the JWT, fetch the user (from the cache, or the DB), return it.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -26,7 +55,16 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, KeyError):
         raise credentials_exception
 
-    user_doc = await users_collection.find_one({"_id": ObjectId(user_id)})
+    try:
+        user_doc = _user_from_claims(payload) or user_cache.get(user_id)
+        if user_doc is None:
+            user_doc = await users_collection.find_one(
+                {"_id": ObjectId(user_id)}, {"password_hash": 0}
+            )
+            if user_doc:
+                user_cache.set(user_id, user_doc)
+    except InvalidId:
+        raise credentials_exception
     if not user_doc:
         raise credentials_exception
 
@@ -1,4 +1,7 @@
 import os
+import hashlib
+import hmac
+import secrets
 import jwt
 from datetime import datetime, timedelta
 from typing import Union
@@ -16,12 +19,26 @@ def create_access_token(data: dict, expires_delta: Union[int, float] = 30):
     Create a JWT with payload 'data' that expires in 'expires_delta' minutes by default.
     """
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=expires_delta)
-    to_encode.update({"exp": expire})
+    now = datetime.utcnow()
+    expire = now + timedelta(minutes=expires_delta)
+    to_encode.update({"exp": expire, "iat": now})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
+def create_refresh_token() -> str:
+    """
+    Create an opaque refresh token. Only its hash (see hash_refresh_token)
+    is stored, so a database leak does not expose usable tokens.
+    """
+    return secrets.token_urlsafe(32)
+
+
+def hash_refresh_token(token: str) -> str:
+    """HMAC-SHA256 of a refresh token, keyed with the API secret."""
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
 def decode_access_token(token: str) -> dict:
     """
     Decode the JWT. Raises jwt.ExpiredSignatureError if token is expired,
@@ -1,9 +1,34 @@
 import uvicorn
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 
 from llm_research_assistant.routes import users, papers, chats, auth, chat_rag, email
+from llm_research_assistant.db import backfill_blobs, create_indexes
+from llm_research_assistant.monitoring import pool_metrics
+from llm_research_assistant.dependencies import user_cache
+from llm_research_assistant.services.extraction_service import shutdown_executor
+from llm_research_assistant.services.ingestion_scheduler import IngestionScheduler
+from llm_research_assistant.services.ingestion_ledger import ledger_stats
+from llm_research_assistant.config import settings
 
-app = FastAPI(title="LLM Research Assistant API", version="0.1.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await create_indexes()
+    # Papers stored before reference counting must be counted before any
+    # upload or delete touches their files
+    await backfill_blobs()
+    scheduler = None
+    if settings.INGEST_SCHEDULER_ENABLED:
+        scheduler = IngestionScheduler()
+        scheduler.start()
+    yield
+    if scheduler:
+        await scheduler.stop()
+    shutdown_executor()
+
+
+app = FastAPI(title="LLM Research Assistant API", version="0.1.0", lifespan=lifespan)
 
 app.include_router(users.router)
 app.include_router(papers.router)
@@ -18,6 +43,24 @@ def root():
     return {"message": "Welcome to LLM Research Assistant API"}
 
 
+@app.get("/metrics/mongo-pool")
+def mongo_pool_metrics():
+    """Connection pool gauges for this worker process."""
+    return pool_metrics.snapshot()
+
+
+@app.get("/metrics/user-cache")
+def user_cache_metrics():
+    """get_current_user cache statistics for this worker process."""
+    return user_cache.stats()
+
+
+@app.get("/metrics/ingestion-ledger")
+def ingestion_ledger_metrics():
+    """Ingestion ledger pre-filter statistics for this worker process."""
+    return ledger_stats()
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "llm_research_assistant.main:app", host="0.0.0.0", port=8000, reload=True
@@ -0,0 +1,131 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+Pages are walked in _id order with `{"_id": {"$gt": last_id}}` instead of
+skip/limit, so every page costs one index seek no matter how deep it is.
+The cursor handed to clients is the last _id of the page (plus the sort
+value for paginate_desc), base64-encoded so callers treat it as opaque. It
+is returned in the X-Next-Cursor header and is absent on the last page.
+"""
+import base64
+import binascii
+
+import bson
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, Response
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(last_id: ObjectId) -> str:
+    """Turn the last _id of a page into an opaque cursor string."""
+    return base64.urlsafe_b64encode(last_id.binary).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> ObjectId:
+    """Turn a cursor string back into an _id, or raise a 400."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return ObjectId(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except (binascii.Error, InvalidId, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+async def paginate(
+    collection,
+    query: dict,
+    limit: int,
+    cursor: str = None,
+    projection: dict = None,
+    response: Response = None,
+):
+    """
+    Return one page of documents matching `query` in ascending _id order.
+
+    One extra document is fetched to tell whether another page exists; if it
+    does, the next cursor is set on `response`.
+    """
+    if cursor:
+        query = {**query, "_id": {"$gt": decode_cursor(cursor)}}
+
+    docs = (
+        await collection.find(query, projection)
+        .sort("_id", 1)
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+
+    if len(docs) > limit:
+        docs = docs[:limit]
+        if response is not None:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(docs[-1]["_id"])
+    return docs
+
+
+def encode_token(state: dict) -> str:
+    """Opaque token carrying a small dict of BSON values (ids, dates, ...)."""
+    raw = bson.encode(state)
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_token(token: str) -> dict:
+    """Return the dict inside a token made by encode_token, or raise a 400."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        return bson.decode(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def encode_sort_cursor(value, last_id: ObjectId) -> str:
+    """Opaque cursor for pages ordered by (field, _id)."""
+    return encode_token({"v": value, "id": last_id})
+
+
+def decode_sort_cursor(cursor: str):
+    """Return (value, _id) from a cursor made by encode_sort_cursor, or raise a 400."""
+    decoded = decode_token(cursor)
+    if "v" not in decoded or "id" not in decoded:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return decoded["v"], decoded["id"]
+
+
+async def paginate_desc(
+    collection,
+    query: dict,
+    field: str,
+    limit: int,
+    cursor: str = None,
+    projection: dict = None,
+    response: Response = None,
+):
+    """
+    Return one page of documents in descending (field, _id) order, e.g. most
+    recently updated first. Needs an index ending in (field: -1, _id: -1).
+    """
+    if cursor:
+        value, last_id = decode_sort_cursor(cursor)
+        query = {
+            **query,
+            "$or": [
+                {field: {"$lt": value}},
+                {field: value, "_id": {"$lt": last_id}},
+            ],
+        }
+
+    docs = (
+        await collection.find(query, projection)
+        .sort([(field, -1), ("_id", -1)])
+        .limit(limit + 1)
+        .to_list(length=limit + 1)
+    )
+
+    if len(docs) > limit:
+        docs = docs[:limit]
+        if response is not None:
+            last = docs[-1]
+            response.headers[NEXT_CURSOR_HEADER] = encode_sort_cursor(
+                last.get(field), last["_id"]
+            )
+    return docs
@@ -1,9 +1,24 @@
+from datetime import datetime, timedelta
 from fastapi import APIRouter, HTTPException, status
 from pydantic import BaseModel, EmailStr
+from pymongo.errors import DuplicateKeyError
 from llm_research_assistant.db import users_collection
-from llm_research_assistant.security import verify_password
-from llm_research_assistant.jwt import create_access_token
+from llm_research_assistant.security import (
+    hash_password_async,
+    verify_and_update_password,
+)
+from llm_research_assistant.config import settings
+from llm_research_assistant.jwt import (
+    create_access_token,
+    create_refresh_token,
+    hash_refresh_token,
+)
 from llm_research_assistant.schemas.users import UserCreate
+from llm_research_assistant.services.mongo_service import (
+    create_user,
+    store_refresh_token,
+    consume_refresh_token,
+)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -13,25 +28,89 @@ class LoginRequest(BaseModel):
     password: str
 
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
+
+async def issue_refresh_token(user_id) -> str:
+    """Create a refresh token for the user and store its hash."""
+    refresh_token = create_refresh_token()
+    await store_refresh_token(
+        hash_refresh_token(refresh_token),
+        user_id,
+        datetime.utcnow() + timedelta(days=settings.REFRESH_TOKEN_DAYS),
+    )
+    return refresh_token
+
+
 @router.post("/login")
 async def login(login_req: LoginRequest):
     """
-    Verify user credentials, return JWT if valid.
+    Verify user credentials, return JWT and a refresh token if valid.
     """
     user = await users_collection.find_one({"email": login_req.email})
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         )
-    if not verify_password(login_req.password, user["password_hash"]):
+    valid, new_hash = await verify_and_update_password(
+        login_req.password, user["password_hash"]
+    )
+    if not valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid email or password"
         )
+    if new_hash:
+        # Hashing parameters changed since this hash was made: upgrade it
+        await users_collection.update_one(
+            {"_id": user["_id"]}, {"$set": {"password_hash": new_hash}}
+        )
 
     # Build a JWT with minimal user info: e.g. str(ObjectId)
     user_id = str(user["_id"])
-    access_token = create_access_token(data={"sub": user_id})
-    return {"access_token": access_token, "token_type": "bearer"}
+    # name/email let get_current_user skip the DB for fresh tokens if enabled
+    access_token = create_access_token(
+        data={"sub": user_id, "name": user["name"], "email": user["email"]},
+        expires_delta=settings.ACCESS_TOKEN_MINUTES,
+    )
+    refresh_token = await issue_refresh_token(user_id)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+    }
+
+
+@router.post("/refresh")
+async def refresh(refresh_req: RefreshRequest):
+    """
+    Exchange a refresh token for a new access token and a new refresh token.
+    The old refresh token is used up (rotation); no password check is needed.
+    """
+    token = await consume_refresh_token(hash_refresh_token(refresh_req.refresh_token))
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired refresh token",
+        )
+
+    user_id = str(token["user_id"])
+    access_token = create_access_token(
+        data={"sub": user_id}, expires_delta=settings.ACCESS_TOKEN_MINUTES
+    )
+    refresh_token = await issue_refresh_token(user_id)
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+    }
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+async def logout(refresh_req: RefreshRequest):
+    """Revoke a refresh token."""
+    await consume_refresh_token(hash_refresh_token(refresh_req.refresh_token))
+    return None
 
 
 @router.post("/register")
@@ -39,18 +118,15 @@ async def register_user(user_in: UserCreate):
     """
     Create a new user, if your app allows self-registration.
     """
-    # Check duplicate
-    existing = await users_collection.find_one({"email": user_in.email})
-    if existing:
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    from security import hash_password
-
-    hashed = hash_password(user_in.password)
+    hashed = await hash_password_async(user_in.password)
     new_user_doc = {
         "name": user_in.name,
         "email": user_in.email,
         "password_hash": hashed,
     }
-    result = await users_collection.insert_one(new_user_doc)
-    return {"message": "User created", "user_id": str(result.inserted_id)}
+    try:
+        # The unique index on email rejects duplicates
+        user = await create_user(new_user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Email already registered")
+    return {"message": "User created", "user_id": str(user["_id"])}
@@ -9,6 +9,10 @@ from llm_research_assistant.rag.chain import (
     process_chat,
 )
 from llm_research_assistant.db import chats_collection
+from llm_research_assistant.services.mongo_service import (
+    append_chat_messages,
+    chat_title_for,
+)
 from bson import ObjectId
 
 router = APIRouter(prefix="/rag", tags=["rag"])
@@ -67,8 +71,10 @@ async def continue_chat(chat_id: str, request: ChatRequest):
     Finally, the updated conversation (with the new question and answer)
     is saved back to the database.
     """
-    # Retrieve the stored chat from the database
-    chat_record = await chats_collection.find_one({"_id": ObjectId(chat_id)})
+    # Retrieve the stored chat from the database (only the recent-message window)
+    chat_record = await chats_collection.find_one(
+        {"_id": ObjectId(chat_id)}, {"message_chain": 1, "title": 1}
+    )
     if not chat_record:
         raise HTTPException(status_code=404, detail="Chat not found")
 
@@ -96,10 +102,14 @@ async def continue_chat(chat_id: str, request: ChatRequest):
     new_human_msg = {"role": "human", "content": request.question}
     new_ai_msg = {"role": "ai", "content": answer}
 
-    # Update the stored chat history by appending new messages
-    updated_history = stored_history + [new_human_msg, new_ai_msg]
-    chats_collection.update_one(
-        {"_id": ObjectId(chat_id)}, {"$set": {"message_chain": updated_history}}
+    # Append the new messages ($push, constant cost whatever the history length)
+    appended = await append_chat_messages(
+        chat_id,
+        [new_human_msg, new_ai_msg],
+        title=chat_title_for(chat_record, request.question),
     )
+    if not appended:
+        # Deleted while the answer was being generated
+        raise HTTPException(status_code=404, detail="Chat not found")
 
     return ChatResponse(answer=answer)
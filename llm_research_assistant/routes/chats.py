@@ -1,10 +1,18 @@
-from fastapi import APIRouter, HTTPException, status, Query
+from fastapi import APIRouter, HTTPException, status, Query, Response
 from pydantic import BaseModel
 from typing import List, Optional
 from bson import ObjectId
 
 from llm_research_assistant.db import chats_collection
-from llm_research_assistant.schemas.chats import ChatCreate, ChatUpdate, ChatResponse
+from llm_research_assistant.schemas.chats import (
+    ChatCreate,
+    ChatUpdate,
+    ChatResponse,
+    ChatSummary,
+    ChatMessagesPage,
+)
+from llm_research_assistant.pagination import paginate_desc
+from llm_research_assistant.services import mongo_service
 from langchain_core.messages import HumanMessage, AIMessage
 from llm_research_assistant.rag.chain import (
     get_documents_from_web,
@@ -15,77 +23,126 @@ from llm_research_assistant.rag.chain import (
 
 router = APIRouter(prefix="/chats", tags=["chats"])
 
+# Only the denormalized fields ChatSummary needs, never the messages
+CHAT_SUMMARY_PROJECTION = {
+    "owner_id": 1,
+    "title": 1,
+    "message_count": 1,
+    "last_message_preview": 1,
+    "updated_at": 1,
+}
+
+
+def _chat_response(chat):
+    """ChatResponse for a chat document, whose message_chain is a window."""
+    chain = chat.get("message_chain", [])
+    message_count = chat.get("message_count", len(chain))
+    return ChatResponse(
+        id=str(chat["_id"]),
+        owner_id=chat["owner_id"],
+        title=chat.get("title"),
+        message_chain=chain,
+        message_count=message_count,
+        first_seq=message_count - len(chain),
+    )
+
 
 @router.post("/", response_model=ChatResponse, status_code=status.HTTP_201_CREATED)
 async def create_chat(chat_in: ChatCreate):
     doc = {
         "owner_id": chat_in.owner_id,
+        "title": chat_in.title,
         "message_chain": chat_in.message_chain,
     }
-    result = await chats_collection.insert_one(doc)
-    chat = await chats_collection.find_one({"_id": result.inserted_id})
-    return ChatResponse(
-        id=str(chat["_id"]),
-        owner_id=chat["owner_id"],
-        message_chain=chat["message_chain"],
-    )
+    chat = await mongo_service.create_chat(doc)
+    return _chat_response(chat)
 
 
-@router.get("/", response_model=List[ChatResponse])
+@router.get("/", response_model=List[ChatSummary])
 async def list_chats(
-    skip: int = 0, limit: int = Query(10, le=100), owner_id: Optional[str] = None
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    owner_id: Optional[str] = None,
 ):
+    """
+    List chat summaries, most recently updated first; messages are fetched
+    per chat from /chats/{chat_id}/messages.
+    Paginated by cursor/limit; the next cursor is in the X-Next-Cursor header.
+    """
     query = {}
     if owner_id:
         query["owner_id"] = owner_id
-    cursor = chats_collection.find(query).skip(skip).limit(limit)
-    chats = await cursor.to_list(length=limit)
+    chats = await paginate_desc(
+        chats_collection,
+        query,
+        "updated_at",
+        limit,
+        cursor=cursor,
+        projection=CHAT_SUMMARY_PROJECTION,
+        response=response,
+    )
     return [
-        ChatResponse(
+        ChatSummary(
             id=str(c["_id"]),
             owner_id=c["owner_id"],
-            message_chain=c["message_chain"],
+            title=c.get("title"),
+            message_count=c.get("message_count", 0),
+            last_message_preview=c.get("last_message_preview"),
+            updated_at=c.get("updated_at"),
         )
         for c in chats
     ]
 
 
+@router.get("/{chat_id}/messages", response_model=ChatMessagesPage)
+async def get_chat_messages(
+    chat_id: str,
+    before: Optional[int] = None,
+    limit: int = Query(50, ge=1, le=200),
+):
+    """
+    Page through a chat's history backwards: without `before` the newest
+    messages are returned; pass the previous page's first_seq to go further back.
+    """
+    page = await mongo_service.get_chat_messages(chat_id, before=before, limit=limit)
+    if page is None:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    messages, first_seq = page
+    return ChatMessagesPage(
+        chat_id=chat_id, messages=messages, first_seq=first_seq, has_more=first_seq > 0
+    )
+
+
 @router.get("/{chat_id}", response_model=ChatResponse)
 async def get_chat_by_id(chat_id: str):
+    """
+    A chat with its latest messages only; when first_seq > 0 the rest of the
+    history is paged from /chats/{chat_id}/messages.
+    """
     chat = await chats_collection.find_one({"_id": ObjectId(chat_id)})
     if not chat:
         raise HTTPException(status_code=404, detail="Chat not found")
-    return ChatResponse(
-        id=str(chat["_id"]),
-        owner_id=chat["owner_id"],
-        message_chain=chat["message_chain"],
-    )
+    return _chat_response(chat)
 
 
 @router.put("/{chat_id}", response_model=ChatResponse)
 async def update_chat(chat_id: str, chat_in: ChatUpdate):
-    chat = await chats_collection.find_one({"_id": ObjectId(chat_id)})
-    if not chat:
-        raise HTTPException(status_code=404, detail="Chat not found")
     update_doc = {}
+    if chat_in.title is not None:
+        update_doc["title"] = chat_in.title
     if chat_in.message_chain is not None:
         update_doc["message_chain"] = chat_in.message_chain
-    if update_doc:
-        await chats_collection.update_one(
-            {"_id": ObjectId(chat_id)}, {"$set": update_doc}
-        )
-    updated_chat = await chats_collection.find_one({"_id": ObjectId(chat_id)})
-    return ChatResponse(
-        id=str(updated_chat["_id"]),
-        owner_id=updated_chat["owner_id"],
-        message_chain=updated_chat["message_chain"],
-    )
+    updated_chat = await mongo_service.update_chat(chat_id, update_doc)
+    if not updated_chat:
+        raise HTTPException(status_code=404, detail="Chat not found")
+    return _chat_response(updated_chat)
 
 
 @router.delete("/{chat_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_chat(chat_id: str):
-    result = await chats_collection.delete_one({"_id": ObjectId(chat_id)})
-    if result.deleted_count == 0:
+    deleted = await mongo_service.delete_chat(chat_id)
+    if not deleted:
         raise HTTPException(status_code=404, detail="Chat not found")
     return None
 
@@ -133,8 +190,10 @@ def chat_endpoint(request: ChatRequest):
 
 @router.post("/chat/{chat_id}", response_model=ChatProcessResponse)
 async def continue_chat(chat_id: str, request: ChatRequest):
-    # Retrieve the stored chat from the DB
-    chat_record = await chats_collection.find_one({"_id": ObjectId(chat_id)})
+    # Retrieve the stored chat from the DB (only the recent-message window)
+    chat_record = await chats_collection.find_one(
+        {"_id": ObjectId(chat_id)}, {"message_chain": 1, "title": 1}
+    )
     if not chat_record:
         raise HTTPException(status_code=404, detail="Chat not found")
     stored_history = chat_record.get("message_chain", [])
@@ -152,9 +211,12 @@ async def continue_chat(chat_id: str, request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
     new_human_msg = {"role": "human", "content": request.question}
     new_ai_msg = {"role": "ai", "content": answer}
-    updated_history = stored_history + [new_human_msg, new_ai_msg]
-    await chats_collection.update_one(
-        {"_id": ObjectId(chat_id)},
-        {"$set": {"message_chain": updated_history}},
+    appended = await mongo_service.append_chat_messages(
+        chat_id,
+        [new_human_msg, new_ai_msg],
+        title=mongo_service.chat_title_for(chat_record, request.question),
     )
+    if not appended:
+        # Deleted while the answer was being generated
+        raise HTTPException(status_code=404, detail="Chat not found")
     return ChatProcessResponse(answer=answer)
@@ -1,16 +1,38 @@
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import hmac
+import secrets
+from typing import Optional
+import jwt
+from fastapi import APIRouter, Cookie, Depends, HTTPException, Response
+from fastapi.responses import JSONResponse, RedirectResponse
 from llm_research_assistant.services.mongo_service import (
     get_email_ingestion,
     create_email_ingestion,
     remove_email_ingestion,
+    schedule_email_sync,
 )
+from llm_research_assistant.config import settings
 from llm_research_assistant.services.email_service import EmailService
+from llm_research_assistant.services.gmail_clients import (
+    exchange_oauth_code,
+    invalidate_gmail_client,
+    oauth_flow,
+)
 from llm_research_assistant.dependencies import get_db, get_current_user
+from llm_research_assistant.jwt import create_access_token, decode_access_token
 from llm_research_assistant.schemas.email import EmailIngestion
 
 
 router = APIRouter(prefix="/email", tags=["email"])
 
+# Binds a started Gmail authorization to the browser that started it
+OAUTH_NONCE_COOKIE = "gmail_oauth_nonce"
+OAUTH_COOKIE_PATH = "/email/oauth"
+
+
+def _nonce_digest(nonce: str) -> str:
+    return hashlib.sha256(nonce.encode()).hexdigest()
+
 
 @router.post("/connect")
 async def connect_email(
@@ -28,9 +50,85 @@ async def connect_email(
 
     # If no existing email ingestion is found, create a new one
     await create_email_ingestion(user_id, email_ingestion)
+    invalidate_gmail_client(user_id)
     return {"message": "Email connected successfully"}
 
 
+@router.get("/oauth/start")
+async def start_gmail_oauth(
+    response: Response, current_user: dict = Depends(get_current_user)
+):
+    """
+    Return the Google consent URL the client should send the user to. Must
+    be called from the browser that will complete the consent (with
+    credentials), as it sets the cookie the callback checks.
+    """
+    # The state is signed and short-lived, so the callback knows which user
+    # started; it carries no "sub" and cannot be used as an access token.
+    # The nonce cookie ties it to this browser: a consent URL handed to
+    # someone else fails in their browser instead of connecting their mailbox
+    # to this account.
+    nonce = secrets.token_urlsafe(32)
+    state = create_access_token(
+        {"gmail_oauth": str(current_user["_id"]), "nonce": _nonce_digest(nonce)},
+        expires_delta=settings.GMAIL_OAUTH_STATE_MINUTES,
+    )
+    response.set_cookie(
+        OAUTH_NONCE_COOKIE,
+        nonce,
+        max_age=settings.GMAIL_OAUTH_STATE_MINUTES * 60,
+        path=OAUTH_COOKIE_PATH,
+        secure=(settings.GOOGLE_OAUTH_REDIRECT_URI or "").startswith("https://"),
+        httponly=True,
+        samesite="lax",  # sent on Google's top-level redirect back
+    )
+    authorization_url, _ = oauth_flow(state).authorization_url(
+        access_type="offline", prompt="consent", state=state
+    )
+    return {"authorization_url": authorization_url}
+
+
+@router.get("/oauth/callback")
+async def gmail_oauth_callback(
+    code: str = None,
+    state: str = None,
+    error: str = None,
+    gmail_oauth_nonce: Optional[str] = Cookie(None),
+):
+    """Google's redirect after consent: exchange the code and store the tokens"""
+    if error or not code or not state:
+        raise HTTPException(
+            status_code=400, detail=f"Gmail authorization failed: {error}"
+        )
+    try:
+        claims = decode_access_token(state)
+        user_id = claims["gmail_oauth"]
+        expected_nonce = claims["nonce"]
+    except (jwt.ExpiredSignatureError, jwt.InvalidTokenError, KeyError):
+        raise HTTPException(status_code=400, detail="Invalid or expired OAuth state")
+    if not gmail_oauth_nonce or not hmac.compare_digest(
+        _nonce_digest(gmail_oauth_nonce), expected_nonce
+    ):
+        raise HTTPException(
+            status_code=400,
+            detail="Gmail authorization was started in another browser",
+        )
+
+    try:
+        await exchange_oauth_code(user_id, code, state)
+    except Exception as e:
+        raise HTTPException(
+            status_code=400, detail=f"Gmail authorization failed: {str(e)}"
+        )
+
+    if settings.GMAIL_OAUTH_SUCCESS_URL:
+        response = RedirectResponse(settings.GMAIL_OAUTH_SUCCESS_URL)
+    else:
+        response = JSONResponse({"message": "Email connected successfully"})
+    response.delete_cookie(OAUTH_NONCE_COOKIE, path=OAUTH_COOKIE_PATH)
+    return response
+
+
 @router.post("/disconnect")
 async def disconnect_email(
     db=Depends(get_db), current_user: dict = Depends(get_current_user)
@@ -43,6 +141,7 @@ async def disconnect_email(
         raise HTTPException(status_code=400, detail="No email ingestion connected")
 
     await remove_email_ingestion(user_id)
+    invalidate_gmail_client(user_id)
     return {"message": "Email ingestion disconnected successfully"}
 
 
@@ -58,7 +157,7 @@ async def fetch_emails(
     if not email_ingestion:
         raise HTTPException(status_code=400, detail="Email ingestion not connected")
 
-    email_service = EmailService(user_id)
+    email_service = EmailService(user_id, email_ingestion["connected_email"])
     await email_service.authenticate()
     papers = await email_service.list_papers()
     return papers
@@ -91,6 +190,11 @@ async def fetch_and_process_emails(
     if not email_ingestion:
         raise HTTPException(status_code=400, detail="Email ingestion not connected")
 
+    if settings.INGEST_SCHEDULER_ENABLED:
+        # The background workers pick the account up on their next poll
+        await schedule_email_sync(user_id)
+        return {"message": "Email sync scheduled."}
+
     # email_service = EmailService(user_id)#pass the email not the userid
     email_service = EmailService(user_id, email_ingestion["connected_email"])
     await email_service.authenticate()
@@ -1,9 +1,20 @@
-from fastapi import APIRouter, HTTPException, status, Query, UploadFile, Depends, File
+from fastapi import (
+    APIRouter,
+    BackgroundTasks,
+    HTTPException,
+    status,
+    Query,
+    Response,
+    UploadFile,
+    Depends,
+    File,
+)
 from typing import List, Optional
-from bson import ObjectId
+import asyncio
 import hashlib
 import fitz
 from llm_research_assistant.services.s3_service import (
+    create_presigned_upload,
     upload_pdf_to_s3,
     get_pdf_url_from_s3,
     delete_pdf_from_s3,
@@ -11,21 +22,43 @@ from llm_research_assistant.services.s3_service import (
 from llm_research_assistant.services.mongo_service import (
     store_paper_metadata,
     get_paper_metadata,
+    store_papers_metadata,
+    update_paper_metadata,
+    create_upload,
+    get_upload,
+    update_upload,
     delete_paper_metadata,
+    release_blob,
+)
+from llm_research_assistant.services.extraction_service import (
+    extract_pdf_text_in_background,
 )
+from llm_research_assistant.services.search_service import search_papers, title_fields
 
+from llm_research_assistant.config import settings
 from llm_research_assistant.db import papers_collection
 from llm_research_assistant.dependencies import get_current_user
+from llm_research_assistant.pagination import paginate
 from llm_research_assistant.schemas.papers import (
     PaperUpdate,
     PaperResponse,
+    PaperSearchResult,
+    BulkUploadResult,
+    BulkUploadResponse,
+    UploadSlotRequest,
+    UploadSlotResponse,
+    UploadStatusResponse,
 )
 
 router = APIRouter(prefix="/papers", tags=["papers"])
 
+# Only the fields PaperResponse needs
+PAPER_LIST_PROJECTION = {"title": 1, "pdf_url": 1, "shared": 1, "owner_id": 1}
+
 
 @router.post("/", response_model=PaperResponse, status_code=status.HTTP_201_CREATED)
 async def create_paper(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     current_user: dict = Depends(get_current_user),
 ):
@@ -35,14 +68,14 @@ async def create_paper(
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
     # Validate PDF structure
-    await validate_pdf(file)
+    pdf_data = await validate_pdf(file)
 
-    # Calculate the file hash
-    file_hash = calculate_file_hash(file)
+    # Calculate the file hash (validate_pdf has already consumed the stream)
+    file_hash = calculate_file_hash(pdf_data)
 
-    # Upload file to S3
+    # Upload the bytes already read and hashed to S3
     pdf_url = await upload_pdf_to_s3(
-        file, current_user["_id"], file.filename, file_hash
+        pdf_data, current_user["_id"], file.filename, file_hash
     )
 
     # Store metadata in MongoDB
@@ -50,6 +83,9 @@ async def create_paper(
         file.filename, pdf_url, current_user["_id"], file_hash
     )
 
+    # Extract text once per file_hash (a cache hit if another owner uploaded it)
+    background_tasks.add_task(extract_pdf_text_in_background, file_hash, pdf_data)
+
     return PaperResponse(
         id=paper_id,
         title=file.filename,
@@ -59,21 +95,206 @@ async def create_paper(
     )
 
 
+@router.post(
+    "/bulk", response_model=BulkUploadResponse, status_code=status.HTTP_201_CREATED
+)
+async def create_papers_bulk(
+    background_tasks: BackgroundTasks,
+    files: List[UploadFile] = File(...),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Upload many PDFs in one request.
+
+    Files are validated, hashed and stored to S3 concurrently (bounded by
+    BULK_UPLOAD_CONCURRENCY), then all metadata is written with one
+    insert_many. Each file gets its own result; one bad file does not fail
+    the batch.
+    """
+    if len(files) > settings.BULK_UPLOAD_MAX_FILES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.BULK_UPLOAD_MAX_FILES} files per request.",
+        )
+
+    owner_id = str(current_user["_id"])
+    semaphore = asyncio.Semaphore(settings.BULK_UPLOAD_CONCURRENCY)
+    uploads = {}  # file_hash -> (filename, pdf_url, pdf_data), first file wins
+
+    async def prepare(file: UploadFile):
+        if not file.filename.endswith(".pdf"):
+            raise ValueError("Only PDF files are allowed")
+        async with semaphore:
+            pdf_data = await file.read()
+            await asyncio.to_thread(check_pdf_data, pdf_data)
+            file_hash = await asyncio.to_thread(calculate_file_hash, pdf_data)
+            if file_hash not in uploads:
+                uploads[file_hash] = None  # claim it before awaiting S3
+                pdf_url = await upload_pdf_to_s3(
+                    pdf_data, owner_id, file.filename, file_hash
+                )
+                uploads[file_hash] = (file.filename, pdf_url, pdf_data)
+            return file_hash
+
+    outcomes = await asyncio.gather(
+        *[prepare(file) for file in files], return_exceptions=True
+    )
+
+    # Skip hashes whose S3 upload failed (their files are reported below)
+    stored = await store_papers_metadata(
+        [
+            (upload[0], upload[1], file_hash)
+            for file_hash, upload in uploads.items()
+            if upload is not None
+        ],
+        owner_id,
+    )
+
+    results = []
+    seen = set()
+    for file, outcome in zip(files, outcomes):
+        if isinstance(outcome, Exception):
+            error = outcome.detail if isinstance(outcome, HTTPException) else outcome
+            results.append(
+                BulkUploadResult(
+                    filename=file.filename, status="failed", error=str(error)
+                )
+            )
+            continue
+        if outcome not in stored:
+            results.append(
+                BulkUploadResult(
+                    filename=file.filename, status="failed", error="Upload failed."
+                )
+            )
+            continue
+
+        paper, created = stored[outcome]
+        results.append(
+            BulkUploadResult(
+                filename=file.filename,
+                status="created" if created and outcome not in seen else "exists",
+                paper=PaperResponse(
+                    id=str(paper["_id"]),
+                    title=paper["title"],
+                    pdf_url=paper["pdf_url"],
+                    shared=paper.get("shared", False),
+                    owner_id=paper["owner_id"],
+                ),
+            )
+        )
+        if created and outcome not in seen:
+            background_tasks.add_task(
+                extract_pdf_text_in_background, outcome, uploads[outcome][2]
+            )
+        seen.add(outcome)
+
+    return BulkUploadResponse(
+        created=sum(r.status == "created" for r in results),
+        existing=sum(r.status == "exists" for r in results),
+        failed=sum(r.status == "failed" for r in results),
+        results=results,
+    )
+
+
+@router.post(
+    "/uploads", response_model=UploadSlotResponse, status_code=status.HTTP_201_CREATED
+)
+async def create_upload_slot(
+    slot_in: UploadSlotRequest, current_user: dict = Depends(get_current_user)
+):
+    """
+    Step 1 of a direct upload: returns a presigned POST for a staging key.
+    The client sends the PDF straight to S3, then calls /complete.
+    """
+    if not slot_in.filename.endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+
+    upload = await create_upload(current_user["_id"], slot_in.filename)
+    presigned = await create_presigned_upload(
+        upload["staging_key"],
+        settings.DIRECT_UPLOAD_MAX_BYTES,
+        expires_in=settings.DIRECT_UPLOAD_EXPIRES_IN,
+    )
+    return UploadSlotResponse(
+        upload_id=str(upload["_id"]),
+        url=presigned["url"],
+        fields=presigned["fields"],
+        expires_in=settings.DIRECT_UPLOAD_EXPIRES_IN,
+        max_bytes=settings.DIRECT_UPLOAD_MAX_BYTES,
+    )
+
+
+@router.post(
+    "/uploads/{upload_id}/complete",
+    response_model=UploadStatusResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+)
+async def complete_upload(
+    upload_id: str, current_user: dict = Depends(get_current_user)
+):
+    """
+    Step 2 of a direct upload: the object is hashed, validated and moved to
+    its content-addressed key by an upload worker, never in the API process.
+    Poll GET /uploads/{id}.
+    """
+    upload = await get_upload(upload_id, current_user["_id"])
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    # Only one /complete call may start processing; the slot no longer
+    # expires, and with no lease_until an upload worker claims it next
+    upload = await update_upload(
+        upload_id,
+        {"status": "processing"},
+        expected_status="pending",
+        unset=["expires_at"],
+    )
+    if not upload:
+        raise HTTPException(status_code=409, detail="Upload already completed")
+    return UploadStatusResponse(upload_id=upload_id, status=upload["status"])
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadStatusResponse)
+async def get_upload_status(
+    upload_id: str, current_user: dict = Depends(get_current_user)
+):
+    """Status of a direct upload; paper_id is set once it is done."""
+    upload = await get_upload(upload_id, current_user["_id"])
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return UploadStatusResponse(
+        upload_id=upload_id,
+        status=upload["status"],
+        paper_id=upload.get("paper_id"),
+        error=upload.get("error"),
+    )
+
+
 @router.get("/", response_model=List[PaperResponse])
 async def list_papers(
-    skip: int = 0, limit: int = Query(10, le=100), owner_id: Optional[str] = None
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+    owner_id: Optional[str] = None,
 ):
     """
     List papers, optionally filtered by owner_id.
-    Paginated by skip/limit.
+    Paginated by cursor/limit; the next cursor is in the X-Next-Cursor header.
     """
     query = {}
     if owner_id:
         # We assume owner_id is a string (the str(ObjectId))
         query["owner_id"] = owner_id
 
-    cursor = papers_collection.find(query).skip(skip).limit(limit)
-    papers = await cursor.to_list(length=limit)
+    papers = await paginate(
+        papers_collection,
+        query,
+        limit,
+        cursor=cursor,
+        projection=PAPER_LIST_PROJECTION,
+        response=response,
+    )
 
     return [
         PaperResponse(
@@ -87,6 +308,31 @@ async def list_papers(
     ]
 
 
+@router.get("/search", response_model=List[PaperSearchResult])
+async def search(
+    q: str = Query(..., min_length=1),
+    prefix: bool = False,
+    limit: int = Query(10, ge=1, le=50),
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Search the user's papers and shared papers by title and extracted text.
+    Set prefix=true for type-ahead, matching the last word as a title prefix.
+    """
+    papers = await search_papers(current_user["_id"], q, limit=limit, prefix=prefix)
+    return [
+        PaperSearchResult(
+            id=str(p["_id"]),
+            title=p["title"],
+            pdf_url=p["pdf_url"],
+            shared=p.get("shared", False),
+            owner_id=p["owner_id"],
+            score=p.get("score"),
+        )
+        for p in papers
+    ]
+
+
 @router.get("/{paper_id}", response_model=PaperResponse)
 async def get_paper_by_id(paper_id: str):
     """Retrieve a single paper by its ObjectId."""
@@ -109,23 +355,17 @@ async def get_paper_by_id(paper_id: str):
 async def update_paper(paper_id: str, paper_in: PaperUpdate):
     """Update paper metadata (title or shared status)."""
 
-    paper = await get_paper_metadata(paper_id)
-
-    if not paper:
-        raise HTTPException(status_code=404, detail="Paper not found")
-
     update_doc = {}
     if paper_in.title is not None:
         update_doc["title"] = paper_in.title
+        update_doc.update(title_fields(paper_in.title))
     if paper_in.shared is not None:
         update_doc["shared"] = paper_in.shared
 
-    if update_doc:
-        await papers_collection.update_one(
-            {"_id": ObjectId(paper_id)}, {"$set": update_doc}
-        )
+    updated_paper = await update_paper_metadata(paper_id, update_doc)
+    if not updated_paper:
+        raise HTTPException(status_code=404, detail="Paper not found")
 
-    updated_paper = await get_paper_metadata(paper_id)
     return PaperResponse(
         id=str(updated_paper["_id"]),
         title=updated_paper["title"],
@@ -151,22 +391,21 @@ async def delete_paper(paper_id: str, current_user: dict = Depends(get_current_u
             status_code=403, detail="You are not authorized to delete this paper."
         )
 
-    # Check how many users are associated
-    # with the file by counting documents with the same file_hash
-    associated_users_count = await papers_collection.count_documents(
-        {"file_hash": paper["file_hash"]}
-    )
+    # Delete the user's metadata from MongoDB
+    deleted = await delete_paper_metadata(paper_id, current_user["_id"])
+    if not deleted:
+        raise HTTPException(status_code=500, detail="Failed to delete paper metadata.")
+
+    # Drop this owner's reference; the file is removed with the last reference
+    remaining = await release_blob(paper["file_hash"])
+    if remaining is None:
+        # Legacy paper without a blob record: fall back to the indexed count
+        remaining = await papers_collection.count_documents(
+            {"file_hash": paper["file_hash"]}, limit=1
+        )
 
     # If the file is shared with other users, prevent deletion from S3
-    if associated_users_count > 1:
-        # Delete the user's metadata from MongoDB
-        result = await delete_paper_metadata(paper_id, current_user["_id"])
-
-        if not result:
-            raise HTTPException(
-                status_code=500, detail="Failed to delete paper metadata."
-            )
-
+    if remaining > 0:
         return {
             "message": "Paper metadata deleted successfully,"
             " but file remains in S3 due to other users."
@@ -175,15 +414,6 @@ async def delete_paper(paper_id: str, current_user: dict = Depends(get_current_u
     try:
         # Delete file from S3
         await delete_pdf_from_s3(paper["pdf_url"])
-
-        # Delete metadata from MongoDB
-        deleted = await delete_paper_metadata(paper_id, current_user["_id"])
-
-        if not deleted:
-            raise HTTPException(
-                status_code=500, detail="Failed to delete paper metadata from MongoDB."
-            )
-
         return {"message": f"File with ID {paper_id} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -211,14 +441,20 @@ async def download_pdf(paper_id: str, current_user: dict = Depends(get_current_u
 
 async def validate_pdf(file: UploadFile):
     """Validate that the uploaded file is a proper PDF."""
+    pdf_data = await file.read()
+    check_pdf_data(pdf_data)
+    return pdf_data
+
+
+def check_pdf_data(pdf_data: bytes):
+    """Raise a 400 unless the bytes parse as a PDF with at least one page."""
     try:
-        pdf_data = await file.read()
-        doc = fitz.open(stream=pdf_data, filetype="pdf")  # Validate PDF
-        if doc.page_count < 1:  # zero pages
-            raise HTTPException(status_code=400, detail="Invalid PDF file.")
-        return pdf_data
+        with fitz.open(stream=pdf_data, filetype="pdf") as doc:  # Validate PDF
+            page_count = doc.page_count
     except Exception:
         raise HTTPException(status_code=400, detail="Corrupt or unreadable PDF.")
+    if page_count < 1:  # zero pages
+        raise HTTPException(status_code=400, detail="Invalid PDF file.")
 
 
 # helper function
@@ -1,11 +1,24 @@
 import bson
-from fastapi import APIRouter, HTTPException, status, Query, Depends
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Query, Depends, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
 from bson import ObjectId
+from pymongo.errors import DuplicateKeyError
 from llm_research_assistant.db import users_collection
 from llm_research_assistant.schemas.users import UserCreate, UserUpdate, UserResponse
-from llm_research_assistant.security import hash_password
-from llm_research_assistant.dependencies import get_current_user
+from llm_research_assistant.security import hash_password_async
+from llm_research_assistant.dependencies import (
+    get_current_user,
+    invalidate_cached_user,
+)
+from llm_research_assistant.pagination import paginate
+from llm_research_assistant.services import mongo_service
+from llm_research_assistant.services.mongo_service import revoke_refresh_tokens
+from llm_research_assistant.services.export_service import (
+    decode_export_cursor,
+    export_user_data,
+    gzip_stream,
+)
 from llm_research_assistant.db import email_ingestion_collection
 
 
@@ -14,25 +27,22 @@ router = APIRouter(prefix="/users", tags=["users"])
 
 @router.post("/", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(user_in: UserCreate):
-    # Check for duplicate email
-    existing_user = await users_collection.find_one({"email": user_in.email})
-    if existing_user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User with this email already exists.",
-        )
-
     # Hash the password
-    hashed = hash_password(user_in.password)
+    hashed = await hash_password_async(user_in.password)
 
     # Prepare document
     user_doc = {"name": user_in.name, "email": user_in.email, "password_hash": hashed}
-    result = await users_collection.insert_one(user_doc)
+    try:
+        # The unique index on email rejects duplicates
+        user = await mongo_service.create_user(user_doc)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User with this email already exists.",
+        )
 
     # Return the newly created user (without sensitive fields)
-    return UserResponse(
-        id=str(result.inserted_id), name=user_in.name, email=user_in.email
-    )
+    return UserResponse(id=str(user["_id"]), name=user["name"], email=user["email"])
 
 
 @router.get("/me", response_model=UserResponse)
@@ -73,10 +83,51 @@ async def get_user_by_id(user_id: str):
     return UserResponse(id=str(user["_id"]), name=user["name"], email=user["email"])
 
 
+@router.get("/{user_id}/export")
+async def export_user(
+    user_id: str,
+    cursor: Optional[str] = None,
+    gzip: bool = False,
+    current_user: dict = Depends(get_current_user),
+):
+    """
+    Stream all of a user's papers and chats as NDJSON, one record per line.
+    Pass the `cursor` of the last line received to resume an interrupted
+    export; `gzip=true` compresses the stream on the fly.
+    """
+    if str(current_user["_id"]) != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+    # Reject a bad cursor now: once streaming starts the 200 is already sent
+    state = decode_export_cursor(cursor) if cursor else None
+    chunks = export_user_data(user_id, state)
+    filename = "export.ndjson"
+    media_type = "application/x-ndjson"
+    if gzip:
+        chunks = gzip_stream(chunks)
+        filename += ".gz"
+        media_type = "application/gzip"
+    return StreamingResponse(
+        chunks,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
 @router.get("/", response_model=List[UserResponse])
-async def list_users(skip: int = 0, limit: int = Query(10, le=100)):
-    cursor = users_collection.find().skip(skip).limit(limit)
-    users = await cursor.to_list(length=limit)
+async def list_users(
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(10, ge=1, le=100),
+):
+    users = await paginate(
+        users_collection,
+        {},
+        limit,
+        cursor=cursor,
+        projection={"name": 1, "email": 1},  # never load password hashes
+        response=response,
+    )
     return [
         UserResponse(id=str(u["_id"]), name=u["name"], email=u["email"]) for u in users
     ]
@@ -84,33 +135,31 @@ async def list_users(skip: int = 0, limit: int = Query(10, le=100)):
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(user_id: str, user_in: UserUpdate):
-    user = await users_collection.find_one({"_id": ObjectId(user_id)})
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="User not found."
-        )
-
     update_doc = {}
     if user_in.name is not None:
         update_doc["name"] = user_in.name
     if user_in.email is not None:
-        # Optionally check for duplicates
-        existing_email_user = await users_collection.find_one({"email": user_in.email})
-        if existing_email_user and existing_email_user["_id"] != user["_id"]:
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Email is already in use.",
-            )
         update_doc["email"] = user_in.email
     if user_in.password is not None:
-        update_doc["password_hash"] = hash_password(user_in.password)
+        update_doc["password_hash"] = await hash_password_async(user_in.password)
 
-    if update_doc:
-        await users_collection.update_one(
-            {"_id": ObjectId(user_id)}, {"$set": update_doc}
+    try:
+        # The unique index on email rejects an address used by another user
+        updated_user = await mongo_service.update_user(user_id, update_doc)
+    except DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Email is already in use.",
+        )
+    if not updated_user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="User not found."
         )
+    invalidate_cached_user(user_id)
+    if "password_hash" in update_doc:
+        # A new password ends every existing session
+        await revoke_refresh_tokens(user_id)
 
-    updated_user = await users_collection.find_one({"_id": ObjectId(user_id)})
     return UserResponse(
         id=str(updated_user["_id"]),
         name=updated_user["name"],
@@ -121,6 +170,8 @@ async def update_user(user_id: str, user_in: UserUpdate):
 @router.delete("/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_user(user_id: str):
     result = await users_collection.delete_one({"_id": ObjectId(user_id)})
+    invalidate_cached_user(user_id)
+    await revoke_refresh_tokens(user_id)
     if result.deleted_count == 0:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found."
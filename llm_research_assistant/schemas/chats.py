@@ -1,9 +1,11 @@
+from datetime import datetime
 from pydantic import BaseModel
 from typing import List, Any, Optional
 
 
 class ChatBase(BaseModel):
     owner_id: str
+    title: Optional[str] = None
     # We can store messages as an array of objects. Example:
     # [{ "role": "user", "content": "Hello" }, ...]
     message_chain: List[Any] = []
@@ -14,11 +16,40 @@ class ChatCreate(ChatBase):
 
 
 class ChatUpdate(BaseModel):
+    title: Optional[str] = None
     message_chain: Optional[List[Any]] = None
 
 
 class ChatResponse(ChatBase):
+    """
+    A chat with its most recent messages: message_chain holds the messages
+    from seq first_seq to message_count - 1. Older ones are paged from
+    /chats/{chat_id}/messages, passing first_seq as `before`.
+    """
+
     id: str
+    message_count: int = 0
+    first_seq: int = 0
 
     class Config:
         orm_mode = True
+
+
+class ChatSummary(BaseModel):
+    """List view of a chat, without its message_chain."""
+
+    id: str
+    owner_id: str
+    title: Optional[str] = None
+    message_count: int = 0
+    last_message_preview: Optional[str] = None
+    updated_at: Optional[datetime] = None
+
+
+class ChatMessagesPage(BaseModel):
+    """A page of a chat's history, oldest message first."""
+
+    chat_id: str
+    messages: List[Any]
+    first_seq: int  # seq of messages[0]; pass as `before` for the previous page
+    has_more: bool
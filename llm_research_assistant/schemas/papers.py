@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import Dict, List, Optional
 
 
 class PaperBase(BaseModel):
@@ -27,3 +27,46 @@ class PaperResponse(PaperBase):
 
     class Config:
         orm_mode = True
+
+
+class PaperSearchResult(PaperResponse):
+    """A paper matched by /papers/search, with its text-search score."""
+
+    score: Optional[float] = None
+
+
+class UploadSlotRequest(BaseModel):
+    filename: str
+
+
+class UploadSlotResponse(BaseModel):
+    """Where and how to POST the PDF directly to storage."""
+
+    upload_id: str
+    url: str
+    fields: Dict[str, str]
+    expires_in: int
+    max_bytes: int
+
+
+class UploadStatusResponse(BaseModel):
+    upload_id: str
+    status: str  # "pending", "processing", "done" or "failed"
+    paper_id: Optional[str] = None
+    error: Optional[str] = None
+
+
+class BulkUploadResult(BaseModel):
+    """Outcome for one file of a bulk upload."""
+
+    filename: str
+    status: str  # "created", "exists" or "failed"
+    paper: Optional[PaperResponse] = None
+    error: Optional[str] = None
+
+
+class BulkUploadResponse(BaseModel):
+    created: int
+    existing: int
+    failed: int
+    results: List[BulkUploadResult]
@@ -1,6 +1,32 @@
+"""
+Password hashing.
+
+bcrypt is deliberately slow, so the async helpers run it on a dedicated,
+bounded thread pool (bcrypt releases the GIL) instead of the event loop.
+When more than PASSWORD_HASH_MAX_QUEUE calls are already waiting, new ones
+are rejected with 429 rather than queueing without limit.
+
+The bcrypt cost is BCRYPT_ROUNDS; hashes made with a different cost are
+flagged by verify_and_update_password so login can transparently rehash.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, status
 from passlib.context import CryptContext
+from llm_research_assistant.config import settings
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__min_rounds=settings.BCRYPT_ROUNDS,
+    bcrypt__max_rounds=settings.BCRYPT_ROUNDS,
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_pending = 0  # calls running or queued on _hash_executor
 
 
 def hash_password(plain_password: str) -> str:
@@ -9,3 +35,35 @@ def hash_password(plain_password: str) -> str:
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
+
+
+async def _run_bounded(func, *args):
+    """Run func on the hashing pool, or raise 429 if the queue is full."""
+    global _pending
+    if _pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many authentication requests, please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+    _pending += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending -= 1
+
+
+async def hash_password_async(plain_password: str) -> str:
+    """hash_password without blocking the event loop."""
+    return await _run_bounded(pwd_context.hash, plain_password)
+
+
+async def verify_and_update_password(plain_password: str, hashed_password: str):
+    """
+    Verify without blocking the event loop. Returns (valid, new_hash); new_hash
+    is set when the stored hash uses outdated parameters and should be saved.
+    """
+    return await _run_bounded(
+        pwd_context.verify_and_update, plain_password, hashed_password
+    )
@@ -0,0 +1,164 @@
+"""
+Rule engine deciding which emails carry academic papers.
+
+An email is academic when its sender domain is a known publisher or a
+university, its subject contains a research keyword and it has a PDF
+attachment. The rules are compiled once: sender domains into a trie over
+reversed domain labels (so a lookup walks the sender's labels once,
+whatever the number of rules), keywords into a single regex alternation
+scanned over the lower-cased subject in one pass. Batches also look up each
+distinct sender domain only once.
+
+The default rules below can be replaced per deployment with a JSON file
+named by ACADEMIC_RULES_FILE, holding any of "allowed_senders",
+"university_domains" and "keywords".
+"""
+import json
+import re
+from llm_research_assistant.config import settings
+
+DEFAULT_ALLOWED_SENDERS = [
+    "arxiv.org",
+    "researchgate.net",
+    "academia.edu",
+    "ieee.org",
+    "springer.com",
+    "elsevier.com",
+    "wiley.com",
+    "nature.com",
+    "sciencedirect.com",
+    "cambridge.org",
+    "oxfordjournals.org",
+]
+
+DEFAULT_UNIVERSITY_DOMAINS = [".edu", ".ac.uk", ".ac.in", ".ac.jp", ".ac.de"]
+
+DEFAULT_KEYWORDS = [
+    "research paper",
+    "published",
+    "preprint",
+    "journal",
+    "paper",
+    "conference",
+    "accepted paper",
+    "proceedings",
+    "arXiv",
+    "DOI",
+]
+
+_SENDER_DOMAIN = re.compile(r"@([\w.-]+)")
+_MATCH = "$"  # trie key holding the reason for a domain ending at that node
+
+
+class DomainTrie:
+    """Domain suffixes stored label by label, top-level domain first."""
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, suffix, reason):
+        node = self._root
+        for label in reversed(suffix.lower().strip(".").split(".")):
+            node = node.setdefault(label, {})
+        node.setdefault(_MATCH, []).append(reason)
+
+    def match(self, domain):
+        """
+        Reasons of every stored suffix the lower-case `domain` ends with, on
+        label boundaries ("export.arxiv.org" matches "arxiv.org").
+        """
+        reasons = []
+        node = self._root
+        for label in reversed(domain.split(".")):
+            node = node.get(label)
+            if node is None:
+                break
+            reasons.extend(node.get(_MATCH, ()))
+        return reasons
+
+
+def _clean_rules(values, name):
+    """Rule entries with surrounding whitespace and empty entries removed."""
+    if isinstance(values, str) or not all(isinstance(v, str) for v in values):
+        raise ValueError(f"Academic rules: {name} must be a list of strings")
+    return [v.strip() for v in values if v.strip().strip(".")]
+
+
+class AcademicClassifier:
+    def __init__(self, allowed_senders, university_domains, keywords):
+        self.allowed_senders = _clean_rules(allowed_senders, "allowed_senders")
+        self.university_domains = _clean_rules(university_domains, "university_domains")
+        self.keywords = _clean_rules(keywords, "keywords")
+        # An empty alternation would match everywhere, and no domains would
+        # turn the Gmail query into from:()
+        if not self.keywords:
+            raise ValueError("Academic rules: at least one keyword is required")
+        if not self.allowed_senders and not self.university_domains:
+            raise ValueError(
+                "Academic rules: at least one sender or university domain is required"
+            )
+
+        self._domains = DomainTrie()
+        for domain in self.allowed_senders:
+            self._domains.add(domain, f"sender:{domain}")
+        for domain in self.university_domains:
+            self._domains.add(domain, f"university:{domain}")
+
+        # Matched against lower-cased subjects: IGNORECASE would disable the
+        # regex engine's first-character scan. Longest first, so "accepted
+        # paper" is reported rather than "paper".
+        alternatives = sorted({k.lower() for k in self.keywords}, key=len, reverse=True)
+        self._keywords = re.compile("|".join(map(re.escape, alternatives)))
+        self._keyword_reasons = {
+            keyword.lower(): f"keyword:{keyword}" for keyword in self.keywords
+        }
+
+    @classmethod
+    def from_settings(cls):
+        """
+        Default rules, overridden by ACADEMIC_RULES_FILE when set. Raises
+        ValueError for rules that cannot classify anything.
+        """
+        rules = {}
+        if settings.ACADEMIC_RULES_FILE:
+            with open(settings.ACADEMIC_RULES_FILE) as f:
+                rules = json.load(f)
+        return cls(
+            rules.get("allowed_senders", DEFAULT_ALLOWED_SENDERS),
+            rules.get("university_domains", DEFAULT_UNIVERSITY_DOMAINS),
+            rules.get("keywords", DEFAULT_KEYWORDS),
+        )
+
+    def classify(self, sender, subject, has_pdf):
+        """Return (is_academic, reasons) for one email's headers."""
+        record = {"from": sender, "subject": subject, "has_pdf": has_pdf}
+        return self.classify_batch([record])[0]
+
+    def classify_batch(self, records):
+        """
+        Classify many emails at once. `records` are dicts with "from",
+        "subject" and "has_pdf"; returns one (is_academic, reasons) per record.
+        """
+        domain_reasons = {}  # sender domains repeat a lot within a mailbox
+        keyword_reasons = self._keyword_reasons
+        find_keywords = self._keywords.findall
+        results = []
+        for record in records:
+            match = _SENDER_DOMAIN.search(record.get("from") or "")
+            domain = match.group(1).lower() if match else ""
+            sender_reasons = domain_reasons.get(domain)
+            if sender_reasons is None:
+                sender_reasons = domain_reasons[domain] = self._domains.match(domain)
+
+            keywords = find_keywords((record.get("subject") or "").lower())
+            reasons = sender_reasons + [
+                keyword_reasons[keyword] for keyword in dict.fromkeys(keywords)
+            ]
+            has_pdf = bool(record.get("has_pdf"))
+            if has_pdf:
+                reasons.append("pdf_attachment")
+            results.append((bool(sender_reasons and keywords and has_pdf), reasons))
+        return results
+
+
+academic_classifier = AcademicClassifier.from_settings()
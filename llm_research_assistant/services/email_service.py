@@ -1,31 +1,42 @@
 # handle interactions with the Gmail API (or future email providers).
 """Store & Refresh OAuth Tokens)"""
-import time
-import os
 from dotenv import load_dotenv
 from fastapi import HTTPException
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from google_auth_oauthlib.flow import InstalledAppFlow
+from google.auth.exceptions import RefreshError
+from llm_research_assistant.config import settings
+from llm_research_assistant.services.gmail_clients import get_gmail_client
 from llm_research_assistant.services.mongo_service import (
     get_email_ingestion,
-    update_email_ingestion,
+    update_email_sync_state,
     store_paper_metadata,
 )
 from llm_research_assistant.services.s3_service import upload_pdf_to_s3
+from llm_research_assistant.services.extraction_service import extract_pdf_text
 from llm_research_assistant.services.gmail_service import (
+    ACADEMIC_QUERY,
+    HistoryExpiredError,
+    get_history_id,
+    list_new_message_ids,
     list_messages,
     filter_academic_emails,
-    get_attachment,
+    get_messages_metadata,
+    AttachmentTooLarge,
+    find_pdf_parts,
+    stream_attachment,
+    quota_error_scope,
+    run_gmail,
 )
-from llm_research_assistant.routes.papers import calculate_file_hash
+from llm_research_assistant.services.ingestion_ledger import (
+    failed_attachments,
+    filter_new_attachments,
+    record_failed,
+    record_ingested,
+)
+from llm_research_assistant.services.pipeline import run_pipeline
 
 # Load environment variables
 load_dotenv()
 
-SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
-
 
 class EmailService:
     def __init__(self, user_id, user_email):
@@ -35,56 +46,28 @@ class EmailService:
         self.service = None
 
     async def authenticate(self):
-        """Authenticate and refresh token if expired."""
+        """
+        Use the user's cached Gmail client; its token is refreshed before it
+        expires (see gmail_clients), so repeated calls cost no I/O. Accounts
+        without a stored token have to go through /email/oauth/start first.
+        """
         try:
-            # email_ingestion = await get_email_ingestion(self.user_email)
-            email_ingestion = await get_email_ingestion(self.user_id)
-
-            if email_ingestion:
-                oauth_token = email_ingestion.get("oauth_token")
-
-                if oauth_token and oauth_token["expires_at"] < time.time():
-                    # Refresh token instead of forcing re-authentication
-                    creds = Credentials(
-                        token=None,
-                        refresh_token=oauth_token["refresh_token"],
-                        token_uri="https://oauth2.googleapis.com/token",
-                        client_id=os.getenv("GOOGLE_CLIENT_ID"),
-                        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
-                    )
-                    creds.refresh(Request())
-
-                    # Store updated token in MongoDB
-                    await update_email_ingestion(
-                        self.user_id,
-                        {
-                            "connected_email": self.user_email,
-                            "provider": "gmail",
-                            "oauth_token": {
-                                "access_token": creds.token,
-                                "refresh_token": creds.refresh_token,
-                                "expires_at": creds.expiry.timestamp(),
-                            },
-                        },
-                    )
-                    self.creds = creds
-                else:
-                    # Perform fresh authentication # idont think i have the json file!!!
-                    flow = InstalledAppFlow.from_client_secrets_file(
-                        os.getenv("GOOGLE_CREDENTIALS_PATH", "credentials.json"), SCOPES
-                    )
-                    self.creds = flow.run_local_server(
-                        port=8080, access_type="offline", prompt="consent"
-                    )
-
-                # Create Gmail service
-                self.service = build("gmail", "v1", credentials=self.creds)
-
+            client = await get_gmail_client(self.user_id)
+        except RefreshError as e:
+            raise HTTPException(
+                status_code=401,
+                detail=f"Gmail authorization expired, reconnect Gmail: {str(e)}",
+            )
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Gmail Authentication failed: {str(e)}"
             )
 
+        if client is None:
+            raise HTTPException(status_code=400, detail="Gmail is not connected")
+        self.creds = client.credentials
+        self.service = client.service
+
     async def get_message_subject(self, message):
         """Extract the subject header from a message."""
         subject = None
@@ -94,25 +77,224 @@ class EmailService:
                 break
         return subject
 
+    async def _scan_papers(self, max_results):
+        # List the last 'max_results' candidate messages; Gmail applies
+        # the sender/attachment rules server-side
+        messages = await run_gmail(
+            list_messages,
+            self.service,
+            user_id="me",
+            query=ACADEMIC_QUERY,
+            max_results=max_results,
+        )
+
+        # Filter the messages to find academic emails
+        return await run_gmail(
+            filter_academic_emails, messages, self.service, user_id="me"
+        )
+
     async def list_papers(self, max_results=30):
         """Fetch the last 'max_results' academic emails."""
         try:
-            # List the last 'max_results' messages from the user's inbox
-            messages = list_messages(
-                self.service, user_id="me", max_results=max_results
-            )
-
-            # Filter the messages to find academic emails
-            academic_emails = filter_academic_emails(
-                messages, self.service, user_id="me"
-            )
-            return academic_emails
-
+            return await self._scan_papers(max_results)
         except Exception as e:
             raise HTTPException(
                 status_code=500, detail=f"Error fetching papers: {str(e)}"
             )
 
+    async def list_new_papers(self, max_results=30):
+        """
+        Fetch academic emails that arrived since the last completed sync.
+
+        Uses the historyId checkpoint stored on email_ingestion, so the cost
+        follows the amount of new mail. Without a usable checkpoint (first
+        sync, or history expired on Gmail's side) it falls back to a full scan
+        of the last 'max_results' messages. Returns (emails, history_id); the
+        caller saves history_id once the emails have been processed.
+        """
+        email_ingestion = await get_email_ingestion(self.user_id)
+        checkpoint = email_ingestion.get("history_id") if email_ingestion else None
+
+        if checkpoint:
+            try:
+                message_ids, history_id = await run_gmail(
+                    list_new_message_ids, self.service, checkpoint, user_id="me"
+                )
+                messages = [{"id": message_id} for message_id in message_ids]
+                academic_emails = await run_gmail(
+                    filter_academic_emails, messages, self.service, user_id="me"
+                )
+                return academic_emails, history_id
+            except HistoryExpiredError:
+                print(f"History checkpoint expired for user {self.user_id}")
+
+        # Read the checkpoint before scanning so mail arriving meanwhile is
+        # picked up by the next incremental sync
+        history_id = await run_gmail(get_history_id, self.service, user_id="me")
+        academic_emails = await self._scan_papers(max_results)
+        return academic_emails, history_id
+
+    async def _retry_emails(self, user_id, max_results, skip_ids):
+        """
+        Emails with attachments earlier syncs failed to ingest, as (email,
+        part IDs to retry) pairs. Messages deleted since count as another
+        failed attempt, so they are eventually given up on.
+        """
+        retry_parts = {}
+        for message_id, part_id in await failed_attachments(user_id, max_results):
+            if message_id not in skip_ids:
+                retry_parts.setdefault(message_id, set()).add(part_id)
+        if not retry_parts:
+            return []
+
+        emails = await run_gmail(
+            get_messages_metadata, self.service, list(retry_parts), user_id="me"
+        )
+        found = {email["id"] for email in emails}
+        for message_id in retry_parts.keys() - found:
+            for part_id in retry_parts[message_id]:
+                await record_failed(
+                    user_id, message_id, part_id, "Message no longer exists"
+                )
+        return [(email, retry_parts[email["id"]]) for email in emails]
+
+    async def sync_papers(self, user_id: str, max_results=30):
+        """
+        Fetch new academic emails, upload their PDFs to S3, store them in
+        MongoDB and extract their text. Returns counts for the run.
+
+        An attachment that fails is recorded in the ingestion ledger and
+        retried by later syncs (up to INGEST_RETRY_MAX_ATTEMPTS times), so
+        it does not hold back the mailbox's history checkpoint. If any
+        attachment hit a Gmail quota error, the checkpoint is kept and that
+        error is re-raised after the others finish so callers can back off.
+        """
+        academic_emails, history_id = await self.list_new_papers(
+            max_results=max_results
+        )
+        retries = await self._retry_emails(
+            user_id, max_results, {email["id"] for email in academic_emails}
+        )
+
+        # Every PDF part of each email, from the payload fetched while
+        # filtering; oversized parts are rejected from their metadata size
+        # and ones already in the ingestion ledger are skipped, both before
+        # any download
+        candidates = []
+        rejected = 0
+        for email, part_ids in [(email, None) for email in academic_emails] + retries:
+            parts = find_pdf_parts(email["payload"])
+            if part_ids is not None:
+                parts = [part for part in parts if part["partId"] in part_ids]
+            if not parts:
+                print(f"No attachment found for email: {email['id']}")
+            for part in parts:
+                if part["body"].get("size", 0) > settings.EMAIL_ATTACHMENT_MAX_BYTES:
+                    print(f"Skipping oversized attachment: {part['filename']}")
+                    rejected += 1
+                    continue
+                candidates.append((email["id"], part["partId"], (email["id"], part)))
+        attachments = await filter_new_attachments(user_id, candidates)
+
+        async def fetch(attachment):
+            # Streamed into a spool (memory up to EMAIL_ATTACHMENT_SPOOL_BYTES,
+            # then a temp file) and hashed while downloading
+            message_id, part = attachment
+            try:
+                spool, file_hash = await stream_attachment(
+                    self.service, message_id, part
+                )
+            except AttachmentTooLarge:
+                print(f"Skipping oversized attachment: {part['filename']}")
+                return None
+            return message_id, part, spool, file_hash
+
+        async def store(attachment):
+            message_id, part, spool, file_hash = attachment
+            filename = part["filename"]
+            try:
+                # Step 1: Upload to S3
+                s3_url = await upload_pdf_to_s3(
+                    spool.file(), user_id, filename, file_hash
+                )  # Upload the file and get the S3 URL
+                print(f"File uploaded to S3: {s3_url}")
+
+                # Step 2: Store metadata in MongoDB
+                paper_id = await store_paper_metadata(
+                    filename, s3_url, user_id, file_hash
+                )  # Store the metadata
+                print(
+                    "Metadata stored in MongoDB for {}, Paper ID: {}".format(
+                        filename, paper_id
+                    )
+                )
+            except BaseException:
+                spool.close()
+                raise
+            return message_id, part, file_hash, paper_id, spool
+
+        async def extract(stored):
+            # Step 3: Extract text (cached per file_hash)
+            message_id, part, file_hash, paper_id, spool = stored
+            with spool:
+                await extract_pdf_text(file_hash, spool.source())
+            # Only a fully ingested attachment goes into the ledger as done;
+            # one that failed at any step is retried by a later sync
+            await record_ingested(
+                user_id, message_id, part["partId"], file_hash, paper_id
+            )
+            return file_hash
+
+        recorded = set()  # ids of the errors queued for a retry in the ledger
+
+        def recording_failures(stage):
+            # Every stage item starts with (message_id, part)
+            async def run(item):
+                try:
+                    return await stage(item)
+                except Exception as e:
+                    if not quota_error_scope(e):
+                        message_id, part = item[0], item[1]
+                        await record_failed(user_id, message_id, part["partId"], str(e))
+                        recorded.add(id(e))
+                    raise
+
+            return run
+
+        # Attachments are downloaded, stored and extracted concurrently,
+        # each stage with its own worker count and a bounded queue
+        papers, errors = await run_pipeline(
+            attachments,
+            [
+                ("fetch", recording_failures(fetch), settings.INGEST_FETCH_CONCURRENCY),
+                ("store", recording_failures(store), settings.INGEST_STORE_CONCURRENCY),
+                (
+                    "extract",
+                    recording_failures(extract),
+                    settings.INGEST_EXTRACT_CONCURRENCY,
+                ),
+            ],
+        )
+
+        # Advance the checkpoint past failures queued for a retry, but not
+        # past quota errors or failures that could not be recorded
+        blocking = [error for error in errors if id(error) not in recorded]
+        if blocking:
+            print(f"{len(blocking)} emails failed; sync checkpoint not advanced")
+            for error in blocking:
+                if quota_error_scope(error):
+                    raise error
+        else:
+            await update_email_sync_state(self.user_id, history_id)
+        return {
+            "emails": len(academic_emails),
+            "retried": sum(len(part_ids) for _, part_ids in retries),
+            "skipped": len(candidates) - len(attachments),
+            "rejected": rejected,
+            "papers": len(papers),
+            "failed": len(errors),
+        }
+
     async def process_academic_papers(
         self,
         user_id: str,
@@ -120,31 +302,6 @@ class EmailService:
     ):
         """Process academic papers: fetch, upload to S3, and store in MongoDB."""
         try:
-            academic_emails = await self.list_papers(max_results=max_results)
-
-            for email in academic_emails:
-                message_id = email["id"]  # Assuming academic emails have 'id' field
-
-                file_data, filename = await get_attachment(self.service, message_id)
-                file_hash = calculate_file_hash(file_data)
-
-                if file_data and filename:
-                    # Step 1: Upload to S3
-                    s3_url = await upload_pdf_to_s3(
-                        file_data, user_id, filename, file_hash
-                    )  # Upload the file and get the S3 URL
-                    print(f"File uploaded to S3: {s3_url}")
-
-                    # Step 2: Store metadata in MongoDB
-                    paper_id = await store_paper_metadata(
-                        filename, s3_url, user_id, file_hash
-                    )  # Store the metadata
-                    print(
-                        "Metadata stored in MongoDB for {}, Paper ID: {}".format(
-                            filename, paper_id
-                        )
-                    )
-                else:
-                    print(f"No attachment found for email: {message_id}")
+            await self.sync_papers(user_id, max_results=max_results)
         except Exception as e:
             print(f"Error processing academic papers: {str(e)}")
@@ -0,0 +1,147 @@
+"""
+Streams a user's papers and chats as NDJSON straight from Motor cursors.
+
+Records are written in a fixed order: papers by _id, then each chat by _id
+followed by its messages by seq. Every line carries a `cursor` token;
+passing the last one received (decoded with decode_export_cursor before
+the response starts) restarts the export right after that line.
+Memory use is bounded by EXPORT_BATCH_SIZE whatever the volume.
+"""
+import json
+import zlib
+from datetime import datetime
+from bson import ObjectId
+from fastapi import HTTPException
+from llm_research_assistant.config import settings
+from llm_research_assistant.db import (
+    papers_collection,
+    chats_collection,
+    chat_messages_collection,
+)
+from llm_research_assistant.pagination import encode_token, decode_token
+
+PAPER_EXPORT_PROJECTION = {"search_terms": 0, "title_terms": 0}
+# message_chain is only read for chats whose history is still embedded
+CHAT_EXPORT_PROJECTION = {
+    "owner_id": 1,
+    "title": 1,
+    "message_count": 1,
+    "last_message_preview": 1,
+    "updated_at": 1,
+    "archived": 1,
+    "message_chain": 1,
+}
+CHAT_INTERNAL_FIELDS = ("archived", "message_chain")
+
+
+def _json_default(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _line(record_type, doc, state):
+    # Document fields first, so they can never shadow the record's own keys
+    record = {**doc, "type": record_type, "cursor": encode_token(state)}
+    return (json.dumps(record, default=_json_default) + "\n").encode("utf-8")
+
+
+async def _chat_messages(chat, after_seq):
+    """Yield (seq, message) for a chat, from chat_messages or its embedded chain."""
+    if chat.get("archived"):
+        cursor = (
+            chat_messages_collection.find(
+                {"chat_id": chat["_id"], "seq": {"$gt": after_seq}},
+                {"_id": 0, "chat_id": 0},
+            )
+            .sort("seq", 1)
+            .batch_size(settings.EXPORT_BATCH_SIZE)
+        )
+        async for message in cursor:
+            yield message.pop("seq"), message
+    else:
+        for seq, message in enumerate(chat.get("message_chain", [])):
+            if seq > after_seq:
+                yield seq, message
+
+
+def decode_export_cursor(resume_token):
+    """Return the export position inside a line's cursor, or raise a 400."""
+    state = decode_token(resume_token)
+    section = state.get("section")
+    if section == "papers":
+        valid = "id" not in state or isinstance(state["id"], ObjectId)
+    elif section == "chats":
+        valid = "id" not in state or (
+            isinstance(state["id"], ObjectId) and isinstance(state.get("seq"), int)
+        )
+    else:
+        valid = False
+    if not valid:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return state
+
+
+async def export_user_data(user_id, state=None):
+    """
+    Async generator of NDJSON lines (bytes) for everything a user owns,
+    starting after `state` (from decode_export_cursor) when given.
+    """
+    owner_id = str(user_id)
+    state = state or {"section": "papers"}
+    batch_size = settings.EXPORT_BATCH_SIZE
+
+    if state["section"] == "papers":
+        query = {"owner_id": owner_id}
+        if "id" in state:
+            query["_id"] = {"$gt": state["id"]}
+        cursor = (
+            papers_collection.find(query, PAPER_EXPORT_PROJECTION)
+            .sort("_id", 1)
+            .batch_size(batch_size)
+        )
+        async for paper in cursor:
+            yield _line("paper", paper, {"section": "papers", "id": paper["_id"]})
+        state = {"section": "chats"}
+
+    # Resuming inside a chat (after its chat line or one of its messages)
+    # finishes that chat's remaining messages first
+    query = {"owner_id": owner_id}
+    resume_seq = None
+    if "id" in state:
+        resume_seq = state["seq"]
+        query["_id"] = {"$gte": state["id"]}
+
+    cursor = (
+        chats_collection.find(query, CHAT_EXPORT_PROJECTION)
+        .sort("_id", 1)
+        .batch_size(batch_size)
+    )
+    async for chat in cursor:
+        if resume_seq is None:
+            chat_doc = {
+                k: v for k, v in chat.items() if k not in CHAT_INTERNAL_FIELDS
+            }
+            yield _line(
+                "chat", chat_doc, {"section": "chats", "id": chat["_id"], "seq": -1}
+            )
+        after_seq = -1 if resume_seq is None else resume_seq
+        async for seq, message in _chat_messages(chat, after_seq):
+            yield _line(
+                "chat_message",
+                {"chat_id": chat["_id"], "seq": seq, **message},
+                {"section": "chats", "id": chat["_id"], "seq": seq},
+            )
+        resume_seq = None
+
+
+async def gzip_stream(chunks):
+    """Gzip an async stream of bytes incrementally."""
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,165 @@
+"""
+Extracts text from PDFs with PyMuPDF and caches the result per file_hash.
+
+PyMuPDF holds the GIL while parsing, so pages are split into ranges and
+extracted in a process pool. The result is stored once in the
+`paper_texts` collection and shared by every owner of the same file; the
+text is kept per page only, and joined by `document_text` when read.
+"""
+import asyncio
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import fitz
+from llm_research_assistant.config import settings
+from llm_research_assistant.db import paper_texts_collection
+from llm_research_assistant.services.search_service import index_paper_text
+
+_executor = None
+_in_flight = {}  # file_hash -> asyncio.Task, so concurrent uploads parse once
+
+
+def get_executor():
+    """Create the extraction process pool on first use."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.PDF_EXTRACT_WORKERS)
+    return _executor
+
+
+def shutdown_executor():
+    """Stop the extraction process pool (called on app shutdown)."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _open_pdf(source):
+    """Open a PDF from bytes or from a local file path."""
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    return fitz.open(source, filetype="pdf")
+
+
+def _write_temp_pdf(data):
+    """Write PDF bytes to a temp file and return its path (caller removes it)."""
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    return path
+
+
+def read_document_info(source):
+    """Return the page count and document metadata (runs in a worker)."""
+    with _open_pdf(source) as doc:
+        return doc.page_count, dict(doc.metadata or {})
+
+
+def _extract_page_range(source, start, stop):
+    """Extract text for pages [start, stop) (runs in a worker)."""
+    pages = []
+    with _open_pdf(source) as doc:
+        for number in range(start, stop):
+            page = doc.load_page(number)
+            text = page.get_text("text")
+            pages.append(
+                {
+                    "page": number + 1,
+                    "text": text,
+                    "char_count": len(text),
+                    "width": page.rect.width,
+                    "height": page.rect.height,
+                }
+            )
+    return pages
+
+
+async def _extract_and_store(file_hash, source):
+    """Run page-parallel extraction in the process pool and cache the result."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+
+    # Workers open the PDF by path, so its bytes are not pickled per task
+    path = source
+    if isinstance(source, (bytes, bytearray)):
+        path = await asyncio.to_thread(_write_temp_pdf, source)
+    try:
+        page_count, metadata = await loop.run_in_executor(
+            executor, read_document_info, path
+        )
+
+        step = max(1, settings.PDF_EXTRACT_PAGES_PER_TASK)
+        chunks = await asyncio.gather(
+            *[
+                loop.run_in_executor(
+                    executor,
+                    _extract_page_range,
+                    path,
+                    start,
+                    min(start + step, page_count),
+                )
+                for start in range(0, page_count, step)
+            ]
+        )
+    finally:
+        if path is not source:
+            os.remove(path)
+    pages = [page for chunk in chunks for page in chunk]
+
+    text_doc = {
+        "file_hash": file_hash,
+        "page_count": page_count,
+        "metadata": metadata,
+        "pages": pages,
+        "extracted_at": datetime.utcnow(),
+    }
+    await paper_texts_collection.update_one(
+        {"file_hash": file_hash}, {"$setOnInsert": text_doc}, upsert=True
+    )
+    return text_doc
+
+
+def document_text(text_doc):
+    """The full text of a cached extraction, joined from its pages."""
+    return "\n".join(page["text"] for page in text_doc["pages"])
+
+
+async def get_extracted_text(file_hash):
+    """Return the cached extraction for a file_hash, or None."""
+    return await paper_texts_collection.find_one({"file_hash": file_hash})
+
+
+async def extract_pdf_text(file_hash, source):
+    """
+    Return the extracted text and page metadata for a PDF.
+
+    `source` is the PDF bytes or a local file path; workers re-open paths
+    themselves, so large files need not be copied through this process.
+
+    A cached extraction is returned as-is; otherwise the PDF is parsed once,
+    even if several requests for the same file_hash arrive concurrently.
+    Papers of this file are indexed for search either way.
+    """
+    text_doc = await get_extracted_text(file_hash)
+    if not text_doc:
+        task = _in_flight.get(file_hash)
+        if task is None:
+            task = asyncio.ensure_future(_extract_and_store(file_hash, source))
+            _in_flight[file_hash] = task
+            task.add_done_callback(lambda _: _in_flight.pop(file_hash, None))
+        text_doc = await asyncio.shield(task)
+
+    # Make the text searchable for any owner's paper that doesn't have it yet
+    await index_paper_text(file_hash, document_text(text_doc))
+    return text_doc
+
+
+async def extract_pdf_text_in_background(file_hash, source):
+    """Fire-and-forget wrapper used after uploads; errors are only logged."""
+    try:
+        await extract_pdf_text(file_hash, source)
+    except Exception as e:
+        print(f"Text extraction failed for {file_hash}: {str(e)}")
@@ -0,0 +1,237 @@
+"""
+Per-user Gmail clients, cached in each worker process.
+
+The Gmail service is built from the discovery document bundled with
+googleapiclient, parsed once at import, and kept together with the user's
+credentials. A stored access token is used as long as it is valid. Within
+GMAIL_TOKEN_REFRESH_MARGIN_SECONDS of its expiry a background task refreshes
+it while requests keep using the current one; only an expired token makes a
+request wait. Refreshes run under a per-user lock, so concurrent requests
+trigger a single one, and the new token is written back to email_ingestion.
+
+Accounts are connected with the web server OAuth flow (oauth_flow and
+exchange_oauth_code, used by the /email/oauth routes); nothing here ever
+waits for a browser.
+"""
+import asyncio
+import json
+import os
+import weakref
+from datetime import datetime, timedelta, timezone
+from google.auth.transport.requests import Request
+from google.oauth2.credentials import Credentials
+from google_auth_oauthlib.flow import Flow
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
+from llm_research_assistant.cache import TTLCache
+from llm_research_assistant.config import settings
+from llm_research_assistant.services.gmail_service import get_email_address, run_gmail
+from llm_research_assistant.services.mongo_service import (
+    get_email_ingestion,
+    update_email_ingestion,
+)
+
+AUTH_URI = "https://accounts.google.com/o/oauth2/auth"
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+GMAIL_SCOPES = ["https://www.googleapis.com/auth/gmail.readonly"]
+GMAIL_DISCOVERY = json.loads(get_static_doc("gmail", "v1"))
+
+gmail_clients = TTLCache(
+    settings.GMAIL_CLIENT_CACHE_SIZE, settings.GMAIL_CLIENT_CACHE_TTL_SECONDS
+)
+_refresh_locks = weakref.WeakValueDictionary()
+_refresh_tasks = {}  # user id -> running background refresh
+
+
+def build_gmail_service(credentials):
+    """Gmail service from the pre-parsed discovery document (no network)."""
+    return build_from_document(GMAIL_DISCOVERY, credentials=credentials)
+
+
+class GmailClient:
+    """A user's credentials and the Gmail service built on them."""
+
+    def __init__(self, connected_email, credentials):
+        self.connected_email = connected_email
+        self.credentials = credentials
+        self.service = build_gmail_service(credentials)
+
+    def expires_within(self, seconds):
+        """True if the access token is missing or expires within `seconds`."""
+        if not self.credentials.token:
+            return True
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return False
+        return expiry - timedelta(seconds=seconds) <= datetime.utcnow()
+
+    def needs_refresh(self):
+        """True if the access token is missing or expires within the margin."""
+        return self.expires_within(settings.GMAIL_TOKEN_REFRESH_MARGIN_SECONDS)
+
+    def is_expired(self):
+        """True if the access token can no longer be used."""
+        return self.expires_within(0)
+
+
+def credentials_from_token(oauth_token):
+    """google-auth Credentials from the oauth_token stored on email_ingestion."""
+    expires_at = oauth_token.get("expires_at")
+    return Credentials(
+        token=oauth_token.get("access_token"),
+        refresh_token=oauth_token.get("refresh_token"),
+        token_uri=TOKEN_URI,
+        client_id=os.getenv("GOOGLE_CLIENT_ID"),
+        client_secret=os.getenv("GOOGLE_CLIENT_SECRET"),
+        # google-auth compares expiry as naive UTC
+        expiry=datetime.utcfromtimestamp(expires_at) if expires_at else None,
+    )
+
+
+def _expires_at(credentials):
+    """Token expiry as a UTC timestamp, or None if Google gave no lifetime."""
+    if credentials.expiry is None:
+        return None
+    return credentials.expiry.replace(tzinfo=timezone.utc).timestamp()
+
+
+async def _refresh(user_id, client):
+    """Refresh the access token (off the event loop) and store the new one."""
+    credentials = client.credentials
+    await run_gmail(credentials.refresh, Request())
+    await update_email_ingestion(
+        user_id,
+        {
+            "connected_email": client.connected_email,
+            "provider": "gmail",
+            "oauth_token": {
+                "access_token": credentials.token,
+                "refresh_token": credentials.refresh_token,
+                "expires_at": _expires_at(credentials),
+            },
+        },
+    )
+
+
+def _refresh_lock(key):
+    lock = _refresh_locks.get(key)
+    if lock is None:
+        lock = _refresh_locks[key] = asyncio.Lock()
+    return lock
+
+
+async def _refresh_in_background(user_id, key, client):
+    try:
+        async with _refresh_lock(key):
+            if client.needs_refresh():
+                await _refresh(user_id, client)
+    except Exception as e:
+        # The next request after expiry retries in the foreground
+        print(f"Background Gmail token refresh for user {user_id} failed: {str(e)}")
+    finally:
+        _refresh_tasks.pop(key, None)
+
+
+def _schedule_refresh(user_id, key, client):
+    """Start a background refresh for the client unless one is running."""
+    if key not in _refresh_tasks:
+        _refresh_tasks[key] = asyncio.create_task(
+            _refresh_in_background(user_id, key, client)
+        )
+
+
+async def get_gmail_client(user_id):
+    """
+    Return the cached GmailClient for a user, loading it from email_ingestion
+    when needed. A token close to expiry is refreshed in the background; an
+    expired one is refreshed before returning. Returns None if the user has
+    no stored OAuth token.
+    """
+    key = str(user_id)
+    client = gmail_clients.get(key)
+    if client is not None and not client.is_expired():
+        if client.needs_refresh():
+            _schedule_refresh(user_id, key, client)
+        return client
+
+    async with _refresh_lock(key):
+        # Another request may have loaded or refreshed it meanwhile
+        client = gmail_clients.get(key)
+        if client is None:
+            email_ingestion = await get_email_ingestion(user_id)
+            if not email_ingestion or not email_ingestion.get("oauth_token"):
+                return None
+            client = GmailClient(
+                email_ingestion["connected_email"],
+                credentials_from_token(email_ingestion["oauth_token"]),
+            )
+        if client.is_expired():
+            await _refresh(user_id, client)
+        gmail_clients.set(key, client)
+    if client.needs_refresh():
+        _schedule_refresh(user_id, key, client)
+    return client
+
+
+def invalidate_gmail_client(user_id):
+    """Drop a cached client, e.g. after the user connects or disconnects Gmail."""
+    gmail_clients.invalidate(str(user_id))
+
+
+def oauth_flow(state=None):
+    """
+    Web server OAuth flow for the Gmail scopes, with the OAuth client from
+    GOOGLE_CLIENT_ID / GOOGLE_CLIENT_SECRET and Google redirecting the user
+    back to GOOGLE_OAUTH_REDIRECT_URI.
+    """
+    client_config = {
+        "web": {
+            "client_id": os.getenv("GOOGLE_CLIENT_ID"),
+            "client_secret": os.getenv("GOOGLE_CLIENT_SECRET"),
+            "auth_uri": AUTH_URI,
+            "token_uri": TOKEN_URI,
+        }
+    }
+    # The client secret authenticates the code exchange, and the flow is
+    # rebuilt in the callback, so no PKCE verifier has to be kept in between
+    return Flow.from_client_config(
+        client_config,
+        GMAIL_SCOPES,
+        state=state,
+        redirect_uri=settings.GOOGLE_OAUTH_REDIRECT_URI,
+        autogenerate_code_verifier=False,
+    )
+
+
+async def exchange_oauth_code(user_id, code, state):
+    """
+    Exchange an authorization code for tokens, store them on the user's
+    email_ingestion with the Gmail address they belong to, and return the
+    new GmailClient.
+    """
+    flow = oauth_flow(state)
+    await run_gmail(flow.fetch_token, code=code)
+    credentials = flow.credentials
+    connected_email = await run_gmail(
+        get_email_address, build_gmail_service(credentials)
+    )
+
+    refresh_token = credentials.refresh_token
+    if not refresh_token:
+        # Google only returns a refresh token on first consent; keep the old one
+        existing = await get_email_ingestion(user_id) or {}
+        refresh_token = existing.get("oauth_token", {}).get("refresh_token")
+    await update_email_ingestion(
+        user_id,
+        {
+            "connected_email": connected_email,
+            "provider": "gmail",
+            "oauth_token": {
+                "access_token": credentials.token,
+                "refresh_token": refresh_token,
+                "expires_at": _expires_at(credentials),
+            },
+        },
+    )
+    invalidate_gmail_client(user_id)
+    return await get_gmail_client(user_id)
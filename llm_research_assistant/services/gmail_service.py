@@ -3,9 +3,175 @@ Uses the authenticated EmailService object to interact with the Gmail API
 ,retrieve emails, filter them, and process attachments.
 """
 from googleapiclient.discovery import build
+import asyncio
+import functools
 import re
 import base64
+import hashlib
+import json
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+import httplib2
+from google.auth.transport.requests import AuthorizedSession
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.errors import HttpError
+from llm_research_assistant.config import settings
+from llm_research_assistant.services.classifier import academic_classifier
+from llm_research_assistant.spool import SpooledFile
+
+GMAIL_API_URL = "https://gmail.googleapis.com/gmail/v1"
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Partial response for classification: headers and part info (two levels of
+# nesting) but no body data, so message bodies are never downloaded.
+_PART_FIELDS = "partId,mimeType,filename,body(attachmentId,size)"
+METADATA_FIELDS = (
+    f"id,threadId,payload(mimeType,headers,"
+    f"parts({_PART_FIELDS},parts({_PART_FIELDS})))"
+)
+
+
+def build_academic_query(base="in:inbox", classifier=academic_classifier):
+    """
+    Compile the sender and attachment rules into a Gmail search query so
+    Gmail only returns candidate messages. The query is deliberately looser
+    than the local rules, and filter_academic_emails still applies the exact
+    rules afterwards.
+    Subject keywords stay local only: Gmail matches whole words, so e.g.
+    `subject:paper` would miss "Papers".
+    """
+    domains = classifier.allowed_senders + [
+        domain.lstrip(".") for domain in classifier.university_domains
+    ]
+    senders = " OR ".join(domains)
+    return f"{base} from:({senders}) has:attachment filename:pdf"
+
+
+ACADEMIC_QUERY = build_academic_query()
+
+# googleapiclient calls block, so async code runs them on this pool
+_gmail_executor = ThreadPoolExecutor(
+    max_workers=settings.GMAIL_IO_WORKERS, thread_name_prefix="gmail-io"
+)
+_thread_state = threading.local()
+
+
+async def run_gmail(func, *args, **kwargs):
+    """Run a blocking Gmail helper on the Gmail I/O pool, off the event loop."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _gmail_executor, functools.partial(func, *args, **kwargs)
+    )
+
+
+def _execute(request, http=None):
+    """
+    Execute a googleapiclient request or batch. httplib2 connections are not
+    thread-safe, so each thread gets its own authorized connection per set of
+    credentials instead of sharing the one built into the service.
+    """
+    credentials = getattr(http or getattr(request, "http", None), "credentials", None)
+    if credentials is None:
+        return request.execute()
+    if not hasattr(_thread_state, "https"):
+        _thread_state.https = weakref.WeakKeyDictionary()
+    thread_http = _thread_state.https.get(credentials)
+    if thread_http is None:
+        thread_http = AuthorizedHttp(credentials, http=httplib2.Http())
+        _thread_state.https[credentials] = thread_http
+    return request.execute(http=thread_http)
+
+
+# Error reasons for quotas shared by the whole project vs. a single mailbox
+PROJECT_QUOTA_REASONS = {"rateLimitExceeded", "dailyLimitExceeded", "quotaExceeded"}
+USER_QUOTA_REASONS = {"userRateLimitExceeded"}
+
+
+def quota_error_scope(error):
+    """
+    Return "project" or "user" if `error` (or the error it wraps) is a Gmail
+    rate-limit/quota error of that scope, otherwise None.
+    """
+    if not isinstance(error, HttpError):
+        cause = getattr(error, "__cause__", None)
+        return quota_error_scope(cause) if cause is not None else None
+    try:
+        details = json.loads(error.content)["error"].get("errors", [])
+        reasons = {detail.get("reason") for detail in details}
+    except (ValueError, KeyError, TypeError, AttributeError):
+        reasons = set()
+    if reasons & PROJECT_QUOTA_REASONS:
+        return "project"
+    if reasons & USER_QUOTA_REASONS or error.resp.status == 429:
+        return "user"
+    return None
+
+
+def retry_after_seconds(error):
+    """Retry-After sent with a Gmail error, in seconds, if any."""
+    error = error if isinstance(error, HttpError) else error.__cause__
+    try:
+        return float(error.resp.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class HistoryExpiredError(Exception):
+    """The stored historyId is too old for users.history.list (HTTP 404)."""
+
+
+def get_history_id(service, user_id="me"):
+    """Current historyId of the mailbox, the starting point for the next sync."""
+    profile = _execute(service.users().getProfile(userId=user_id, fields="historyId"))
+    return profile["historyId"]
+
+
+def get_email_address(service, user_id="me"):
+    """Address of the mailbox the service's credentials belong to."""
+    profile = _execute(
+        service.users().getProfile(userId=user_id, fields="emailAddress")
+    )
+    return profile["emailAddress"]
+
+
+def list_new_message_ids(service, start_history_id, user_id="me"):
+    """
+    Return (message IDs added to the inbox since start_history_id, latest
+    historyId). Raises HistoryExpiredError when Gmail no longer has history
+    that far back, in which case the caller has to fall back to a full scan.
+    """
+    message_ids = []
+    history_id = start_history_id
+    page_token = None
+    while True:
+        try:
+            response = _execute(
+                service.users()
+                .history()
+                .list(
+                    userId=user_id,
+                    startHistoryId=start_history_id,
+                    historyTypes=["messageAdded"],
+                    labelId="INBOX",
+                    pageToken=page_token,
+                    fields="history(messagesAdded(message(id))),"
+                    "historyId,nextPageToken",
+                )
+            )
+        except HttpError as error:
+            if error.resp.status == 404:
+                raise HistoryExpiredError(start_history_id)
+            raise
+
+        for record in response.get("history", []):
+            for added in record.get("messagesAdded", []):
+                message_ids.append(added["message"]["id"])
+        history_id = response.get("historyId", history_id)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            break
+    return list(dict.fromkeys(message_ids)), history_id
 
 
 def get_gmail_service(creds):
@@ -18,11 +184,8 @@ def list_messages(
 ):  # limit msg for 10 testing
     """List messages from the Gmail account."""
     messages = []
-    response = (
-        service.users()
-        .messages()
-        .list(userId=user_id, q=query, maxResults=max_results)
-        .execute()
+    response = _execute(
+        service.users().messages().list(userId=user_id, q=query, maxResults=max_results)
     )
 
     while "messages" in response:
@@ -31,7 +194,7 @@ def list_messages(
             break  # Exit once we've hit the limit
         if "nextPageToken" in response:
             page_token = response["nextPageToken"]
-            response = (
+            response = _execute(
                 service.users()
                 .messages()
                 .list(
@@ -40,111 +203,235 @@ def list_messages(
                     pageToken=page_token,
                     maxResults=max_results,
                 )
-                .execute()
             )
         else:
             break
     return messages
 
 
+def get_messages_metadata(service, message_ids, user_id="me"):
+    """
+    Fetch headers and part info for many messages with Gmail batch requests,
+    GMAIL_BATCH_SIZE messages per HTTP call. Messages whose sub-request fails
+    (e.g. rate limited) are retried once in a new batch; if some still fail,
+    the last error is raised so the sync is not recorded as complete.
+    Messages deleted since they were listed (404) are left out.
+    """
+    message_ids = list(dict.fromkeys(message_ids))
+    results = {}
+    pending = message_ids
+    for _ in range(2):
+        failed = []
+        errors = []
+
+        def callback(request_id, response, exception):
+            if isinstance(exception, HttpError) and exception.resp.status == 404:
+                return
+            if exception is not None:
+                failed.append(request_id)
+                errors.append(exception)
+            else:
+                results[request_id] = response
+
+        for start in range(0, len(pending), settings.GMAIL_BATCH_SIZE):
+            batch = service.new_batch_http_request(callback=callback)
+            for msg_id in pending[start : start + settings.GMAIL_BATCH_SIZE]:
+                batch.add(
+                    service.users()
+                    .messages()
+                    .get(
+                        userId=user_id,
+                        id=msg_id,
+                        format="full",
+                        fields=METADATA_FIELDS,
+                    ),
+                    request_id=msg_id,
+                )
+            _execute(batch, http=getattr(service, "_http", None))
+        if not failed:
+            break
+        pending = failed
+    else:
+        print(f"{len(failed)} messages could not be fetched")
+        raise errors[-1]
+
+    return [results[msg_id] for msg_id in message_ids if msg_id in results]
+
+
+def iter_parts(payload):
+    """Yield every part of a message payload, including nested multiparts."""
+    for part in payload.get("parts", []):
+        yield part
+        yield from iter_parts(part)
+
+
 def filter_academic_emails(messages, service, user_id="me"):
     """
     Filter emails related to academic content
     based on sender, subject, and PDF attachments.
     """
-    # Define filtering criteria
-    ALLOWED_SENDERS = [
-        "arxiv.org",
-        "researchgate.net",
-        "academia.edu",
-        "ieee.org",
-        "springer.com",
-        "elsevier.com",
-        "wiley.com",
-        "nature.com",
-        "sciencedirect.com",
-        "cambridge.org",
-        "oxfordjournals.org",
-    ]
+    filtered_messages = []
 
-    UNIVERSITY_DOMAINS = [".edu", ".ac.uk", ".ac.in", ".ac.jp", ".ac.de"]
-
-    KEYWORDS = [
-        "research paper",
-        "published",
-        "preprint",
-        "journal",
-        "paper",
-        "conference",
-        "accepted paper",
-        "proceedings",
-        "arXiv",
-        "DOI",
-    ]
+    metadata = get_messages_metadata(
+        service, [message["id"] for message in messages], user_id=user_id
+    )
 
-    filtered_messages = []
+    records = []
+    for msg in metadata:
+        headers = {
+            header["name"]: header["value"]
+            for header in msg["payload"].get("headers", [])
+            if header["name"] in ("From", "Subject")
+        }
+        records.append(
+            {
+                "from": headers.get("From", ""),
+                "subject": headers.get("Subject", ""),
+                "has_pdf": any(
+                    part.get("filename") and part.get("mimeType") == "application/pdf"
+                    for part in iter_parts(msg["payload"])
+                ),
+            }
+        )
 
-    for message in messages:
-        msg = service.users().messages().get(userId=user_id, id=message["id"]).execute()
+    # Sender, subject and attachment rules, evaluated for the whole batch
+    for msg, (is_academic, reasons) in zip(
+        metadata, academic_classifier.classify_batch(records)
+    ):
+        if is_academic:
+            msg["classification_reasons"] = reasons
+            filtered_messages.append(msg)
 
-        sender = None
-        subject = None
-        for header in msg["payload"]["headers"]:
-            if header["name"] == "From":
-                sender = header["value"]
-            elif header["name"] == "Subject":
-                subject = header["value"]
+    return filtered_messages
 
-        # Extract sender domain
-        match = re.search(r"@([\w.-]+)", sender)
 
-        sender_domain = match.group(1) if match else ""
+def _download_part(service, msg_id, part):
+    """Download and decode one attachment part (blocking)."""
+    attachment = _execute(
+        service.users()
+        .messages()
+        .attachments()
+        .get(userId="me", messageId=msg_id, id=part["body"]["attachmentId"])
+    )
+    data = attachment["data"]
+    return base64.urlsafe_b64decode(data.encode("UTF-8"))
 
-        # Check if sender is academic
-        is_academic_sender = any(
-            domain in sender_domain for domain in ALLOWED_SENDERS
-        ) or any(sender_domain.endswith(edu) for edu in UNIVERSITY_DOMAINS)
 
-        # Check if subject contains research-related keywords
-        is_research_related = any(
-            keyword.lower() in subject.lower() for keyword in KEYWORDS
-        )
+def find_pdf_parts(payload):
+    """Every PDF attachment part of a message payload."""
+    return [
+        part
+        for part in iter_parts(payload)
+        if part.get("filename")
+        and part.get("mimeType") == "application/pdf"
+        and part["body"].get("attachmentId")
+    ]
 
-        # Check if email has a PDF attachment
-        has_pdf = False
-        if "parts" in msg["payload"]:
-            for part in msg["payload"]["parts"]:
-                if part.get("filename") and part.get("mimeType") == "application/pdf":
-                    has_pdf = True
-                    break
 
-        # If all conditions match, add to filtered messages
-        if is_academic_sender and is_research_related and has_pdf:
-            filtered_messages.append(msg)
+class AttachmentTooLarge(Exception):
+    """An attachment is bigger than EMAIL_ATTACHMENT_MAX_BYTES."""
 
-    return filtered_messages
+
+def _thread_session(credentials):
+    """This thread's requests session for `credentials` (sessions aren't shared)."""
+    if not hasattr(_thread_state, "sessions"):
+        _thread_state.sessions = weakref.WeakKeyDictionary()
+    session = _thread_state.sessions.get(credentials)
+    if session is None:
+        session = AuthorizedSession(credentials)
+        _thread_state.sessions[credentials] = session
+    return session
 
 
-async def get_attachment(service, msg_id):
-    """Fetch the attachment from an email by message ID."""
+def _base64_chunks(chunks):
+    """
+    Yield the raw base64 text of the "data" field from a streamed
+    attachments.get response (requested with fields=data), chunk by chunk.
+    """
+    head = b""
+    in_data = False
+    for chunk in chunks:
+        if not in_data:
+            head += chunk
+            match = re.search(rb'"data"\s*:\s*"', head)
+            if not match:
+                if len(head) > 1024:
+                    raise ValueError("Unexpected attachment response")
+                continue
+            chunk, head, in_data = head[match.end() :], b"", True
+        end = chunk.find(b'"')
+        if end != -1:
+            yield chunk[:end]
+            return
+        yield chunk
+    raise ValueError("Truncated attachment response")
+
+
+def _stream_part(service, msg_id, part, max_bytes):
+    """
+    Download an attachment part into a SpooledFile, decoding the base64 body
+    and hashing it as it arrives (blocking). Returns (spool, sha256 hex).
+    Memory use is one network chunk plus the spool's in-memory threshold.
+    """
+    spool = SpooledFile(settings.EMAIL_ATTACHMENT_SPOOL_BYTES)
+    sha256 = hashlib.sha256()
     try:
-        message = service.users().messages().get(userId="me", id=msg_id).execute()
-        for part in message["payload"]["parts"]:
-            # Check if the part is an attachment
-            if part["filename"] and part["body"].get("attachmentId"):
-                attachment = (
-                    service.users()
-                    .messages()
-                    .attachments()
-                    .get(userId="me", messageId=msg_id, id=part["body"]["attachmentId"])
-                    .execute()
-                )
+        credentials = getattr(getattr(service, "_http", None), "credentials", None)
+        if credentials is None:
+            # Services without google-auth credentials: plain request
+            data = _download_part(service, msg_id, part)
+            chunks = [
+                data[i : i + STREAM_CHUNK_SIZE]
+                for i in range(0, len(data), STREAM_CHUNK_SIZE)
+            ]
+        else:
+            chunks = _stream_decoded(credentials, msg_id, part)
+        for data in chunks:
+            if spool.size + len(data) > max_bytes:
+                raise AttachmentTooLarge(part["filename"])
+            sha256.update(data)
+            spool.write(data)
+    except BaseException:
+        spool.close()
+        raise
+    return spool, sha256.hexdigest()
 
-                data = attachment["data"]
-                file_data = base64.urlsafe_b64decode(data.encode("UTF-8"))
-                file_name = part["filename"]
-                return file_data, file_name  # Return file content and filename
 
-        return None, None
+def _stream_decoded(credentials, msg_id, part):
+    """Yield decoded bytes of an attachment streamed from the Gmail REST API."""
+    url = (
+        f"{GMAIL_API_URL}/users/me/messages/{msg_id}"
+        f"/attachments/{part['body']['attachmentId']}"
+    )
+    session = _thread_session(credentials)
+    with session.get(url, params={"fields": "data"}, stream=True) as response:
+        if response.status_code >= 400:
+            # Same error type as googleapiclient so quota handling applies
+            resp = httplib2.Response(
+                {"status": response.status_code, **response.headers}
+            )
+            raise HttpError(resp, response.content, uri=url)
+        pending = b""
+        for text in _base64_chunks(response.iter_content(STREAM_CHUNK_SIZE)):
+            pending += text
+            usable = len(pending) - len(pending) % 4
+            if usable:
+                yield base64.urlsafe_b64decode(pending[:usable])
+                pending = pending[usable:]
+        if pending:
+            yield base64.urlsafe_b64decode(pending + b"=" * (-len(pending) % 4))
+
+
+async def stream_attachment(service, msg_id, part, max_bytes=None):
+    """
+    Stream an attachment part into a SpooledFile on the Gmail I/O pool;
+    returns (spool, sha256 hex) and the caller closes the spool. Parts whose
+    metadata size exceeds `max_bytes` are rejected before any download.
+    """
+    max_bytes = max_bytes or settings.EMAIL_ATTACHMENT_MAX_BYTES
+    if part["body"].get("size", 0) > max_bytes:
+        raise AttachmentTooLarge(part["filename"])
+    try:
+        return await run_gmail(_stream_part, service, msg_id, part, max_bytes)
     except HttpError as error:
-        raise Exception(f"An error occurred: {error}")
+        raise Exception(f"An error occurred: {error}") from error
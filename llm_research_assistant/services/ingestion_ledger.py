@@ -0,0 +1,97 @@
+"""
+Ledger of the email attachments each user has already ingested.
+
+Entries live in the ingestion_ledger collection, unique on (user_id,
+message_id, attachment_id), and are checked before any attachment is
+downloaded. attachment_id is the MIME partId: Gmail's attachmentId changes
+every time a message is fetched, so it cannot identify an attachment.
+
+A per-process Bloom filter sits in front of the collection. Candidates it
+has never seen are new without a query; only its hits are confirmed in
+MongoDB. Each user's entries are loaded on first use, and entries recorded
+by other processes since then are picked up on every check.
+
+Attachments that failed to ingest are kept with status "failed" (and never
+enter the filter), so later syncs can retry them after the mailbox's
+history checkpoint has moved on.
+"""
+from datetime import datetime, timedelta
+from llm_research_assistant.bloom import BloomFilter
+from llm_research_assistant.config import settings
+from llm_research_assistant.services.mongo_service import (
+    iter_ingestion_ledger,
+    find_ingested_attachments,
+    list_failed_attachments,
+    record_failed_attachment,
+    record_ingested_attachment,
+)
+
+# Margin for clock skew between processes writing created_at
+_SYNC_MARGIN = timedelta(minutes=1)
+
+_seen = BloomFilter(
+    settings.INGEST_LEDGER_BLOOM_CAPACITY, settings.INGEST_LEDGER_BLOOM_ERROR_RATE
+)
+_synced_at = {}  # user_id -> when this process last loaded the user's entries
+
+
+def _key(user_id, message_id, attachment_id):
+    return f"{user_id}:{message_id}:{attachment_id}"
+
+
+async def _sync_user(user_id):
+    """Add the user's ledger entries recorded since the last load to the filter."""
+    now = datetime.utcnow()
+    since = _synced_at.get(user_id)
+    async for message_id, attachment_id in iter_ingestion_ledger(
+        user_id, since=since - _SYNC_MARGIN if since else None
+    ):
+        _seen.add(_key(user_id, message_id, attachment_id))
+    _synced_at[user_id] = now
+
+
+async def filter_new_attachments(user_id, candidates):
+    """
+    Return the items of `candidates`, a list of (message_id, attachment_id,
+    item), whose attachment has not been ingested for this user yet.
+    """
+    user_id = str(user_id)
+    await _sync_user(user_id)
+    maybe_seen = {
+        message_id
+        for message_id, attachment_id, _ in candidates
+        if _key(user_id, message_id, attachment_id) in _seen
+    }
+    ingested = (
+        await find_ingested_attachments(user_id, maybe_seen) if maybe_seen else set()
+    )
+    return [
+        item
+        for message_id, attachment_id, item in candidates
+        if (message_id, attachment_id) not in ingested
+    ]
+
+
+async def record_ingested(user_id, message_id, attachment_id, file_hash, paper_id):
+    """Mark an attachment as ingested for the user."""
+    user_id = str(user_id)
+    await record_ingested_attachment(
+        user_id, message_id, attachment_id, file_hash, paper_id
+    )
+    _seen.add(_key(user_id, message_id, attachment_id))
+
+
+async def record_failed(user_id, message_id, attachment_id, error):
+    """Queue an attachment that failed to ingest for a retry by a later sync."""
+    await record_failed_attachment(str(user_id), message_id, attachment_id, error)
+
+
+async def failed_attachments(user_id, limit):
+    """(message_id, attachment_id) pairs to retry, at most `limit` of them."""
+    return await list_failed_attachments(
+        str(user_id), settings.INGEST_RETRY_MAX_ATTEMPTS, limit
+    )
+
+
+def ledger_stats():
+    return {**_seen.stats(), "users_loaded": len(_synced_at)}
@@ -0,0 +1,170 @@
+"""
+Background email ingestion for every connected account.
+
+Worker tasks repeatedly claim the account that has waited longest for a sync
+(claim_due_email_ingestion), run one bounded sync for it and record the
+outcome and the next due time on its email_ingestion document. Each run
+handles a single account and then requeues it, so busy mailboxes cannot
+starve the others, and the lease on next_run_at lets several processes
+share the work.
+
+Gmail quota errors back off adaptively: a per-user error delays only that
+account (exponentially, or by Retry-After), a project-wide error also pauses
+every worker in this process, with a pause that doubles while errors persist
+and resets after a successful run.
+
+Runs inside the API when INGEST_SCHEDULER_ENABLED is set, or on its own:
+
+    python -m llm_research_assistant.services.ingestion_scheduler
+"""
+import asyncio
+import random
+from datetime import datetime, timedelta
+from llm_research_assistant.config import settings
+from llm_research_assistant.db import create_indexes
+from llm_research_assistant.services.email_service import EmailService
+from llm_research_assistant.services.gmail_clients import get_gmail_client
+from llm_research_assistant.services.gmail_service import (
+    quota_error_scope,
+    retry_after_seconds,
+)
+from llm_research_assistant.services.mongo_service import (
+    claim_due_email_ingestion,
+    record_email_ingestion_run,
+)
+
+
+async def connect_email_service(email_ingestion):
+    """Default connector: an EmailService using the account's cached client."""
+    client = await get_gmail_client(email_ingestion["user_id"])
+    if client is None:
+        # Background workers never start an interactive OAuth flow
+        raise RuntimeError("No stored OAuth token for this account")
+    email_service = EmailService(
+        email_ingestion["user_id"], email_ingestion["connected_email"]
+    )
+    email_service.creds = client.credentials
+    email_service.service = client.service
+    return email_service
+
+
+def backoff_seconds(failures, retry_after=None):
+    """Capped exponential backoff with jitter, never shorter than Retry-After."""
+    delay = min(
+        settings.INGEST_BACKOFF_MAX_SECONDS,
+        settings.INGEST_BACKOFF_SECONDS * 2**failures,
+    )
+    delay *= random.uniform(0.5, 1.0)
+    return max(delay, retry_after or 0)
+
+
+class IngestionScheduler:
+    """
+    A pool of ingestion workers. `connect` turns an email_ingestion document
+    into an object with an async sync_papers(user_id, max_results) method;
+    by default an authenticated EmailService, while tests can pass one
+    wrapping a fake Gmail service.
+    """
+
+    def __init__(self, workers: int = None, connect=connect_email_service):
+        self.workers = workers or settings.INGEST_SCHEDULER_WORKERS
+        self.connect = connect
+        self._tasks = []
+        self._stopping = None
+        self._project_pause = 0
+        self._paused_until = 0.0
+
+    def start(self):
+        self._stopping = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers; an interrupted sync is retried when its lease ends."""
+        self._stopping.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _sleep(self, seconds):
+        """Sleep, waking early when the scheduler stops."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), timeout=seconds)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while not self._stopping.is_set():
+            pause = self._paused_until - loop.time()
+            if pause > 0:
+                await self._sleep(pause)
+                continue
+            try:
+                email_ingestion = await claim_due_email_ingestion(
+                    settings.INGEST_LEASE_SECONDS
+                )
+                if email_ingestion is None:
+                    await self._sleep(settings.INGEST_POLL_SECONDS)
+                    continue
+                await self.run_once(email_ingestion)
+            except Exception as e:
+                print(f"Ingestion worker error: {str(e)}")
+                await self._sleep(settings.INGEST_POLL_SECONDS)
+
+    def _pause_project(self, retry_after=None):
+        """Pause all workers after a project-wide quota error; returns the pause."""
+        self._project_pause = min(
+            settings.INGEST_BACKOFF_MAX_SECONDS,
+            max(settings.INGEST_BACKOFF_SECONDS, self._project_pause * 2),
+        )
+        pause = max(self._project_pause, retry_after or 0)
+        loop = asyncio.get_running_loop()
+        self._paused_until = max(self._paused_until, loop.time() + pause)
+        return pause
+
+    async def run_once(self, email_ingestion):
+        """Sync one claimed account and record the outcome."""
+        user_id = email_ingestion["user_id"]
+        try:
+            email_service = await self.connect(email_ingestion)
+            stats = await email_service.sync_papers(
+                user_id, max_results=settings.INGEST_MAX_MESSAGES
+            )
+        except Exception as e:
+            scope = quota_error_scope(e)
+            retry_after = retry_after_seconds(e)
+            delay = backoff_seconds(
+                email_ingestion.get("consecutive_failures", 0), retry_after
+            )
+            if scope == "project":
+                delay = max(delay, self._pause_project(retry_after))
+            status = "rate_limited" if scope else "error"
+            print(f"Email sync for user {user_id} failed ({status}): {str(e)}")
+            await record_email_ingestion_run(
+                user_id,
+                status,
+                datetime.utcnow() + timedelta(seconds=delay),
+                error=str(e),
+            )
+            return
+
+        self._project_pause = 0
+        interval = timedelta(seconds=settings.INGEST_SYNC_INTERVAL_SECONDS)
+        await record_email_ingestion_run(
+            user_id, "ok", datetime.utcnow() + interval, stats=stats
+        )
+
+
+async def main():
+    await create_indexes()
+    scheduler = IngestionScheduler()
+    scheduler.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await scheduler.stop()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
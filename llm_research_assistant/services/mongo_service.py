@@ -1,33 +1,443 @@
+from datetime import datetime, timedelta
 from bson import ObjectId
-from llm_research_assistant.db import papers_collection, email_ingestion_collection
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from llm_research_assistant.config import settings
+from llm_research_assistant.db import (
+    users_collection,
+    papers_collection,
+    chats_collection,
+    chat_messages_collection,
+    refresh_tokens_collection,
+    email_ingestion_collection,
+    blobs_collection,
+    uploads_collection,
+    ingestion_ledger_collection,
+)
 from llm_research_assistant.schemas.email import EmailIngestion
+from llm_research_assistant.services.search_service import title_fields
 
 
-async def store_paper_metadata(filename, pdf_url, user_id, file_hash):
-    """Stores metadata in MongoDB and returns the document ID."""
+async def insert_document(collection, doc):
+    """Inserts a document and returns it with its new _id (one round trip)."""
+    await collection.insert_one(doc)  # insert_one sets doc["_id"]
+    return doc
+
+
+async def update_document(collection, document_id, fields, projection=None):
+    """
+    Applies $set to a document by _id and returns the updated document, or
+    None if it does not exist, in a single round trip.
+    """
+    query = {"_id": ObjectId(document_id)}
+    if not fields:
+        return await collection.find_one(query, projection)
+    return await collection.find_one_and_update(
+        query,
+        {"$set": fields},
+        projection=projection,
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def create_user(user_doc):
+    """Creates a user; raises DuplicateKeyError if the email is taken."""
+    return await insert_document(users_collection, user_doc)
+
+
+async def update_user(user_id, fields):
+    """Updates a user; raises DuplicateKeyError if the new email is taken."""
+    return await update_document(
+        users_collection, user_id, fields, projection={"password_hash": 0}
+    )
 
-    # Check if the file with the same hash already exists for the user
-    existing_file = await papers_collection.find_one(
+
+PREVIEW_LENGTH = 120
+
+
+def chat_summary_fields(message_chain):
+    """Denormalized summary fields for a chat whose history is message_chain."""
+    last_message = message_chain[-1] if message_chain else {}
+    return {
+        "message_count": len(message_chain),
+        "last_message_preview": _preview(last_message),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def _preview(message):
+    content = message.get("content", "") if isinstance(message, dict) else ""
+    return str(content)[:PREVIEW_LENGTH]
+
+
+async def store_refresh_token(token_hash, user_id, expires_at):
+    """Stores the hash of a newly issued refresh token."""
+    await refresh_tokens_collection.insert_one(
         {
-            "file_hash": file_hash,
-            "owner_id": str(user_id),  # Ensure it is for the current user
+            "_id": token_hash,
+            "user_id": ObjectId(user_id),
+            "expires_at": expires_at,
+            "created_at": datetime.utcnow(),
         }
     )
 
-    if existing_file:
-        # If the file already exists, return the existing document's ID
-        print(f"File '{filename}' already exists for user {user_id}")
-        return str(existing_file["_id"])  # Return the existing paper ID
 
+async def consume_refresh_token(token_hash):
+    """
+    Atomically removes a refresh token and returns it, or None if it is
+    unknown, already used or expired. Each token can be redeemed only once.
+    """
+    token = await refresh_tokens_collection.find_one_and_delete({"_id": token_hash})
+    if not token or token["expires_at"] < datetime.utcnow():
+        return None
+    return token
+
+
+async def revoke_refresh_tokens(user_id):
+    """Removes every refresh token of a user (logs out all sessions)."""
+    await refresh_tokens_collection.delete_many({"user_id": ObjectId(user_id)})
+
+
+async def create_chat(chat_doc):
+    """Creates a chat (with its summary fields) and returns it."""
+    chat_doc = {**chat_doc, **chat_summary_fields(chat_doc["message_chain"])}
+    return await insert_document(chats_collection, chat_doc)
+
+
+async def update_chat(chat_id, fields):
+    """Updates a chat and returns it, or None if it does not exist."""
+    if "message_chain" not in fields:
+        return await update_document(chats_collection, chat_id, fields)
+
+    # Replacing the history: drop the archived messages and let the next
+    # append re-archive the new chain
+    await chat_messages_collection.delete_many({"chat_id": ObjectId(chat_id)})
+    return await chats_collection.find_one_and_update(
+        {"_id": ObjectId(chat_id)},
+        {
+            "$set": {**fields, **chat_summary_fields(fields["message_chain"])},
+            "$unset": {"archived": ""},
+        },
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def delete_chat(chat_id):
+    """Deletes a chat and its archived messages; returns True if it existed."""
+    result = await chats_collection.delete_one({"_id": ObjectId(chat_id)})
+    if result.deleted_count:
+        await chat_messages_collection.delete_many({"chat_id": ObjectId(chat_id)})
+    return result.deleted_count > 0
+
+
+async def _archive_embedded_messages(chat):
+    """
+    Copies a chat's embedded message_chain into chat_messages and marks the
+    chat archived. Chats get here on their first append after being created
+    (or replaced) with an initial chain, or if they predate chat_messages.
+    """
+    chain = chat.get("message_chain", [])
+    if chain:
+        try:
+            await chat_messages_collection.insert_many(
+                [
+                    {"chat_id": chat["_id"], "seq": seq, **message}
+                    for seq, message in enumerate(chain)
+                ],
+                ordered=False,
+            )
+        except BulkWriteError as e:
+            # Another request archived the same chat concurrently
+            if any(err.get("code") != 11000 for err in e.details["writeErrors"]):
+                raise
+    await chats_collection.update_one(
+        {"_id": chat["_id"], "archived": {"$ne": True}},
+        {
+            "$set": {"archived": True, **chat_summary_fields(chain)},
+            "$push": {
+                "message_chain": {"$each": [], "$slice": -settings.CHAT_HOT_WINDOW}
+            },
+        },
+    )
+
+
+TITLE_LENGTH = 60
+
+
+def chat_title_for(chat, question):
+    """Title to set when appending `question`: untitled chats take its start."""
+    return None if chat.get("title") else question[:TITLE_LENGTH]
+
+
+async def append_chat_messages(chat_id, messages, title=None):
+    """
+    Appends messages to a chat in constant time, whatever its length.
+
+    The chat document keeps only the last CHAT_HOT_WINDOW messages ($push
+    with $slice) and an atomic message_count; each message is also stored in
+    chat_messages under its sequence number. Concurrent appends get distinct
+    sequence numbers. The summary fields (and `title`, if given) are updated
+    in the same write. Returns False if the chat does not exist.
+    """
+    chat_oid = ObjectId(chat_id)
+    summary = {
+        "last_message_preview": _preview(messages[-1]),
+        "updated_at": datetime.utcnow(),
+    }
+    if title:
+        summary["title"] = title
+
+    for _ in range(2):
+        chat = await chats_collection.find_one_and_update(
+            {"_id": chat_oid, "archived": True},
+            {
+                "$inc": {"message_count": len(messages)},
+                "$push": {
+                    "message_chain": {
+                        "$each": messages,
+                        "$slice": -settings.CHAT_HOT_WINDOW,
+                    }
+                },
+                "$set": summary,
+            },
+            projection={"message_count": 1},
+            return_document=ReturnDocument.AFTER,
+        )
+        if chat:
+            break
+        unarchived = await chats_collection.find_one(
+            {"_id": chat_oid}, {"message_chain": 1, "archived": 1}
+        )
+        if not unarchived:
+            return False
+        if not unarchived.get("archived"):
+            await _archive_embedded_messages(unarchived)
+    else:
+        return False
+
+    first_seq = chat["message_count"] - len(messages)
+    now = summary["updated_at"]
+    await chat_messages_collection.insert_many(
+        [
+            {"chat_id": chat_oid, "seq": first_seq + i, "created_at": now, **message}
+            for i, message in enumerate(messages)
+        ]
+    )
+    return True
+
+
+async def get_chat_messages(chat_id, before=None, limit=50):
+    """
+    Returns (messages, first_seq) for up to `limit` messages preceding seq
+    `before` (default: the newest), oldest first, or None if the chat does
+    not exist. first_seq is the seq of the first message returned.
+    """
+    chat_oid = ObjectId(chat_id)
+    chat = await chats_collection.find_one(
+        {"_id": chat_oid}, {"archived": 1, "message_count": 1}
+    )
+    if not chat:
+        return None
+
+    if "message_count" not in chat:
+        # Chat predates summary fields: its whole history is embedded
+        chain = (await chats_collection.find_one({"_id": chat_oid}))["message_chain"]
+        end = len(chain) if before is None else max(0, min(before, len(chain)))
+        start = max(0, end - limit)
+        return chain[start:end], start
+
+    total = chat["message_count"]
+    end = total if before is None else max(0, min(before, total))
+    start = max(0, end - limit)
+    if start == end:
+        return [], start
+
+    if chat.get("archived"):
+        cursor = chat_messages_collection.find(
+            {"chat_id": chat_oid, "seq": {"$gte": start, "$lt": end}},
+            {"_id": 0, "chat_id": 0},
+        ).sort("seq", 1)
+        return await cursor.to_list(length=end - start), start
+
+    # Not archived yet: the full history is still embedded, page it with $slice
+    chat = await chats_collection.find_one(
+        {"_id": chat_oid}, {"message_chain": {"$slice": [start, end - start]}}
+    )
+    return chat.get("message_chain", []), start
+
+
+async def update_paper_metadata(paper_id, fields):
+    """Updates a paper and returns it, or None if it does not exist."""
+    return await update_document(papers_collection, paper_id, fields)
+
+
+async def _seed_blob(file_hash, fields):
+    """
+    Fill in a blob record missing its file fields, creating it if needed with
+    a reference count seeded from the papers already pointing at the file, so
+    papers stored before reference counting are never left uncounted.
+    """
+    ref_count = await papers_collection.count_documents({"file_hash": file_hash})
+    try:
+        await blobs_collection.update_one(
+            {"_id": file_hash, "pdf_url": {"$exists": False}},
+            {
+                "$set": fields,
+                "$setOnInsert": {
+                    "ref_count": ref_count,
+                    "created_at": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # Another writer recorded the file first; keep its record
+    return await blobs_collection.find_one({"_id": file_hash})
+
+
+async def get_blob(file_hash):
+    """
+    Return the stored-file record for a file_hash (an _id lookup), or None.
+    A file only known from legacy papers gets its record created here.
+    """
+    blob = await blobs_collection.find_one({"_id": file_hash})
+    if blob is not None and "pdf_url" in blob:
+        return blob
+    paper = await papers_collection.find_one({"file_hash": file_hash}, {"pdf_url": 1})
+    if paper is None:
+        return None
+    return await _seed_blob(file_hash, {"pdf_url": paper["pdf_url"]})
+
+
+async def create_blob(file_hash, pdf_url, s3_key):
+    """Record a newly stored file, counting any papers that already use it."""
+    await _seed_blob(file_hash, {"pdf_url": pdf_url, "s3_key": s3_key})
+
+
+async def acquire_blob(file_hash, count=1):
+    """Atomically add references to a stored file (creating its record)."""
+    await blobs_collection.update_one(
+        {"_id": file_hash}, {"$inc": {"ref_count": count}}, upsert=True
+    )
+
+
+async def acquire_blobs(counts):
+    """Add references to several stored files in one round trip."""
+    if not counts:
+        return
+    await blobs_collection.bulk_write(
+        [
+            UpdateOne({"_id": file_hash}, {"$inc": {"ref_count": count}}, upsert=True)
+            for file_hash, count in counts.items()
+        ],
+        ordered=False,
+    )
+
+
+async def release_blob(file_hash):
+    """
+    Atomically drop one reference to a stored file.
+
+    Returns the remaining reference count, 0 if the blob record was removed
+    (the caller should then delete the object from storage), or None for
+    legacy papers uploaded before blobs were tracked.
+    """
+    blob = await blobs_collection.find_one_and_update(
+        {"_id": file_hash},
+        {"$inc": {"ref_count": -1}},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is None:
+        return None
+    if blob["ref_count"] > 0:
+        return blob["ref_count"]
+
+    # Only remove the record if nobody re-acquired it in the meantime
+    result = await blobs_collection.delete_one(
+        {"_id": file_hash, "ref_count": {"$lte": 0}}
+    )
+    return 0 if result.deleted_count else 1
+
+
+async def store_paper_metadata(filename, pdf_url, user_id, file_hash):
+    """Stores metadata in MongoDB and returns the document ID."""
+
+    new_id = ObjectId()
     paper_doc = {
+        "_id": new_id,
         "title": filename,
-        "owner_id": str(user_id),
         "shared": False,
         "pdf_url": pdf_url,
-        "file_hash": file_hash,  # Store the file hash to prevent duplicate uploads
+        **title_fields(filename),
     }
-    result = await papers_collection.insert_one(paper_doc)
-    return str(result.inserted_id)  # Return the ObjectId as a string
+    # Insert unless the user already has this file (same hash), in one round trip
+    paper = await papers_collection.find_one_and_update(
+        {
+            "owner_id": str(user_id),
+            "file_hash": file_hash,  # Store the file hash to prevent duplicate uploads
+        },
+        {"$setOnInsert": paper_doc},
+        projection={"_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+
+    if paper["_id"] != new_id:
+        # If the file already exists, return the existing document's ID
+        print(f"File '{filename}' already exists for user {user_id}")
+        return str(paper["_id"])  # Return the existing paper ID
+
+    await acquire_blob(file_hash)
+    return str(new_id)  # Return the ObjectId as a string
+
+
+async def store_papers_metadata(papers, user_id):
+    """
+    Stores metadata for several papers with a single insert_many.
+
+    `papers` is a list of (filename, pdf_url, file_hash) with distinct hashes.
+    Returns {file_hash: (paper_doc, created)}; papers the user already owns
+    are returned with created=False.
+    """
+    paper_docs = [
+        {
+            "title": filename,
+            "owner_id": str(user_id),
+            "shared": False,
+            "pdf_url": pdf_url,
+            "file_hash": file_hash,
+            **title_fields(filename),
+        }
+        for filename, pdf_url, file_hash in papers
+    ]
+    if not paper_docs:
+        return {}
+
+    duplicate_indexes = set()
+    try:
+        # insert_many assigns each document's _id client-side
+        await papers_collection.insert_many(paper_docs, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != 11000:
+                raise
+            duplicate_indexes.add(error["index"])
+
+    stored = {}
+    for index, doc in enumerate(paper_docs):
+        if index not in duplicate_indexes:
+            stored[doc["file_hash"]] = (doc, True)
+
+    if duplicate_indexes:
+        duplicate_hashes = [paper_docs[i]["file_hash"] for i in duplicate_indexes]
+        cursor = papers_collection.find(
+            {"owner_id": str(user_id), "file_hash": {"$in": duplicate_hashes}}
+        )
+        async for doc in cursor:
+            stored[doc["file_hash"]] = (doc, False)
+
+    await acquire_blobs({h: 1 for h, (_, created) in stored.items() if created})
+    return stored
 
 
 async def get_paper_metadata(paper_id):
@@ -46,6 +456,64 @@ async def delete_paper_metadata(paper_id, user_id):
     return result.deleted_count > 0  # Returns True if deletion was successful
 
 
+async def create_upload(user_id, filename):
+    """
+    Creates a pending direct-upload slot and returns its document. The slot
+    expires (TTL on expires_at) unless the upload is completed in time.
+    """
+    upload_id = ObjectId()
+    now = datetime.utcnow()
+    upload_doc = {
+        "_id": upload_id,
+        "owner_id": str(user_id),
+        "filename": filename,
+        "staging_key": f"staging/{user_id}/{upload_id}.pdf",
+        "status": "pending",
+        "created_at": now,
+        "expires_at": now + timedelta(seconds=settings.UPLOAD_SLOT_TTL_SECONDS),
+    }
+    await uploads_collection.insert_one(upload_doc)
+    return upload_doc
+
+
+async def get_upload(upload_id, user_id):
+    """Retrieves one of the user's upload slots."""
+    return await uploads_collection.find_one(
+        {"_id": ObjectId(upload_id), "owner_id": str(user_id)}
+    )
+
+
+async def update_upload(upload_id, fields, expected_status=None, unset=()):
+    """
+    Sets fields (and unsets the `unset` ones) on an upload slot and returns
+    the updated document. With expected_status, only transitions from that
+    status (else None).
+    """
+    query = {"_id": ObjectId(upload_id)}
+    if expected_status is not None:
+        query["status"] = expected_status
+    update = {"$set": fields}
+    if unset:
+        update["$unset"] = {field: "" for field in unset}
+    return await uploads_collection.find_one_and_update(
+        query, update, return_document=ReturnDocument.AFTER
+    )
+
+
+async def claim_processing_upload(lease_seconds: float):
+    """
+    Claim a completed upload waiting to be finalized. Its lease_until is
+    pushed out by `lease_seconds` so no other worker takes it; if this worker
+    dies, the upload is claimed again when the lease runs out.
+    """
+    now = datetime.utcnow()
+    return await uploads_collection.find_one_and_update(
+        {"status": "processing", "lease_until": {"$not": {"$gt": now}}},
+        {"$set": {"lease_until": now + timedelta(seconds=lease_seconds)}},
+        return_document=ReturnDocument.AFTER,
+    )
+
+
 async def create_email_ingestion(user_id: str, email_ingestion_data: EmailIngestion):
     """Store email ingestion credentials asynchronously"""
     print("the email ingestion data inside th create method: ", email_ingestion_data)
@@ -86,6 +554,155 @@ async def update_email_ingestion(user_id: str, email_ingestion_data: EmailIngest
     )
 
 
+async def update_email_sync_state(user_id: str, history_id: str):
+    """Record the Gmail historyId checkpoint reached by a completed sync."""
+    await email_ingestion_collection.update_one(
+        {"user_id": ObjectId(user_id)},
+        {"$set": {"history_id": history_id, "last_synced_at": datetime.utcnow()}},
+    )
+
+
+async def claim_due_email_ingestion(lease_seconds: float):
+    """
+    Claim the connected account that has waited longest for its next sync
+    (accounts that never ran come first). Its next_run_at is pushed out by
+    `lease_seconds` so no other worker takes it; if this worker dies, the
+    account simply becomes due again when the lease runs out.
+    """
+    now = datetime.utcnow()
+    return await email_ingestion_collection.find_one_and_update(
+        {"next_run_at": {"$not": {"$gt": now}}},
+        {
+            "$set": {
+                "next_run_at": now + timedelta(seconds=lease_seconds),
+                "running_since": now,
+            }
+        },
+        sort=[("next_run_at", 1)],
+        return_document=ReturnDocument.AFTER,
+    )
+
+
+async def record_email_ingestion_run(
+    user_id, status: str, next_run_at, error: str = None, stats: dict = None
+):
+    """Store the outcome of a scheduled sync and when the next one is due."""
+    update = {
+        "$set": {
+            "last_run_at": datetime.utcnow(),
+            "last_status": status,
+            "last_error": error,
+            "next_run_at": next_run_at,
+        },
+        "$unset": {"running_since": ""},
+    }
+    if status == "ok":
+        update["$set"]["consecutive_failures"] = 0
+        update["$set"]["last_run_stats"] = stats
+    else:
+        update["$inc"] = {"consecutive_failures": 1}
+    await email_ingestion_collection.update_one({"user_id": ObjectId(user_id)}, update)
+
+
+async def schedule_email_sync(user_id: str):
+    """Make a user's account due for a scheduled sync right away."""
+    await email_ingestion_collection.update_one(
+        {"user_id": ObjectId(user_id), "running_since": {"$exists": False}},
+        {"$set": {"next_run_at": datetime.utcnow()}},
+    )
+
+
+async def iter_ingestion_ledger(user_id: str, since=None):
+    """Yield (message_id, attachment_id) of a user's ingested attachments."""
+    query = {"user_id": user_id, "status": {"$ne": "failed"}}
+    if since is not None:
+        query["created_at"] = {"$gte": since}
+    cursor = ingestion_ledger_collection.find(
+        query, {"_id": 0, "message_id": 1, "attachment_id": 1}
+    )
+    async for entry in cursor:
+        yield entry["message_id"], entry["attachment_id"]
+
+
+async def find_ingested_attachments(user_id: str, message_ids):
+    """(message_id, attachment_id) pairs already ingested among these messages."""
+    cursor = ingestion_ledger_collection.find(
+        {
+            "user_id": user_id,
+            "message_id": {"$in": list(message_ids)},
+            "status": {"$ne": "failed"},
+        },
+        {"_id": 0, "message_id": 1, "attachment_id": 1},
+    )
+    return {(entry["message_id"], entry["attachment_id"]) async for entry in cursor}
+
+
+async def record_ingested_attachment(
+    user_id: str, message_id: str, attachment_id: str, file_hash: str, paper_id: str
+):
+    """
+    Mark an attachment as ingested in the ledger, replacing a failed entry.
+    created_at is the time it was ingested, so processes loading entries
+    incrementally pick up retried attachments too.
+    """
+    try:
+        await ingestion_ledger_collection.update_one(
+            {
+                "user_id": user_id,
+                "message_id": message_id,
+                "attachment_id": attachment_id,
+            },
+            {
+                "$set": {
+                    "status": "done",
+                    "file_hash": file_hash,
+                    "paper_id": paper_id,
+                    "created_at": datetime.utcnow(),
+                },
+                "$unset": {"error": ""},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # Recorded concurrently by another worker
+
+
+async def record_failed_attachment(
+    user_id: str, message_id: str, attachment_id: str, error: str
+):
+    """
+    Record a failed attempt at ingesting an attachment, so later syncs retry
+    it. No-op if the attachment has been ingested meanwhile.
+    """
+    now = datetime.utcnow()
+    try:
+        await ingestion_ledger_collection.update_one(
+            {
+                "user_id": user_id,
+                "message_id": message_id,
+                "attachment_id": attachment_id,
+                "status": "failed",
+            },
+            {
+                "$set": {"error": error, "updated_at": now},
+                "$inc": {"attempts": 1},
+                "$setOnInsert": {"created_at": now},
+            },
+            upsert=True,
+        )
+    except DuplicateKeyError:
+        pass  # Already ingested (the upsert collided with the done entry)
+
+
+async def list_failed_attachments(user_id: str, max_attempts: int, limit: int):
+    """(message_id, attachment_id) of a user's failed attachments still to retry."""
+    cursor = ingestion_ledger_collection.find(
+        {"user_id": user_id, "status": "failed", "attempts": {"$lt": max_attempts}},
+        {"_id": 0, "message_id": 1, "attachment_id": 1},
+    ).limit(limit)
+    return [(entry["message_id"], entry["attachment_id"]) async for entry in cursor]
+
+
 async def remove_email_ingestion(user_id: str):
     """Remove email ingestion details for a user"""
     await email_ingestion_collection.delete_one({"user_id": user_id})
@@ -0,0 +1,58 @@
+"""
+Bounded async pipelines.
+
+Items flow through a list of stages, each run by its own number of workers
+and connected by small bounded queues, so a slow stage applies backpressure
+to the ones before it instead of everything being buffered in memory.
+"""
+import asyncio
+
+_DONE = object()
+
+
+async def run_pipeline(items, stages):
+    """
+    Push `items` through `stages`, a list of (name, async function,
+    concurrency). Each function receives the previous stage's result;
+    returning None drops the item. A failing item is logged and dropped
+    without stopping the others.
+
+    Returns (results of the last stage, exceptions of the items that failed).
+    """
+    queues = [asyncio.Queue(maxsize=concurrency * 2) for _, _, concurrency in stages]
+    results = []
+    errors = []
+
+    async def feed():
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0][2]):
+            await queues[0].put(_DONE)
+
+    async def run_stage(index):
+        name, func, concurrency = stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(stages) else None
+
+        async def worker():
+            while (item := await inbox.get()) is not _DONE:
+                try:
+                    result = await func(item)
+                except Exception as e:
+                    errors.append(e)
+                    print(f"Pipeline stage {name} failed: {str(e)}")
+                    continue
+                if result is None:
+                    continue
+                if outbox is None:
+                    results.append(result)
+                else:
+                    await outbox.put(result)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        if outbox is not None:
+            for _ in range(stages[index + 1][2]):
+                await outbox.put(_DONE)
+
+    await asyncio.gather(feed(), *(run_stage(i) for i in range(len(stages))))
+    return results, errors
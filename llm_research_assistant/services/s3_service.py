@@ -3,7 +3,8 @@ import os
 from dotenv import load_dotenv
 import asyncio
 from io import BytesIO
-from llm_research_assistant.db import papers_collection
+from starlette.datastructures import UploadFile
+from llm_research_assistant.services.mongo_service import get_blob, create_blob
 
 
 # Load AWS credentials
@@ -23,11 +24,11 @@ S3_BUCKET_NAME = os.getenv("S3_BUCKET_NAME")
 async def upload_pdf_to_s3(file, user_id, filename, file_hash):
     """Uploads a PDF to S3 and returns the file URL."""
 
-    # Check if the file hash already exists in MongoDB
-    existing_file = await papers_collection.find_one({"file_hash": file_hash})
+    # Check if the file hash is already stored (an _id lookup on blobs)
+    existing_blob = await get_blob(file_hash)
 
-    if existing_file:
-        return existing_file["pdf_url"]  # Return the existing URL for this file
+    if existing_blob:
+        return existing_blob["pdf_url"]  # Return the existing URL for this file
 
     # If the file does not exist, upload it to S3
     s3_file_key = (
@@ -36,8 +37,12 @@ async def upload_pdf_to_s3(file, user_id, filename, file_hash):
     try:
         if isinstance(file, bytes):
             file_data = BytesIO(file)  # Convert bytes into a file-like object
+        elif isinstance(file, UploadFile):
+            # Routes receive Starlette's UploadFile, whose read/seek are
+            # coroutines; boto3 needs the sync file underneath
+            file_data = file.file
         else:
-            file_data = file.file  # This works for local file uploads (UploadFile)
+            file_data = file  # Already a file object (e.g. a spooled download)
 
         # file.file.seek(0) #for upload
         file_data.seek(0)
@@ -45,12 +50,64 @@ async def upload_pdf_to_s3(file, user_id, filename, file_hash):
         await asyncio.to_thread(
             s3_client.upload_fileobj, file_data, S3_BUCKET_NAME, s3_file_key
         )
-        pdf_url = "https://{}.s3.amazonaws.com/{}".format(S3_BUCKET_NAME, s3_file_key)
+        pdf_url = get_s3_url(s3_file_key)
+        await create_blob(file_hash, pdf_url, s3_file_key)
         return pdf_url
     except Exception as e:
         raise Exception(f"S3 upload failed: {str(e)}")
 
 
+def get_s3_url(s3_file_key):
+    """Public-style URL stored in paper metadata for an S3 key."""
+    return "https://{}.s3.amazonaws.com/{}".format(S3_BUCKET_NAME, s3_file_key)
+
+
+async def create_presigned_upload(s3_file_key, max_bytes, expires_in=900):
+    """
+    Returns a presigned POST (url + form fields) that lets the client upload
+    a PDF of at most `max_bytes` straight to `s3_file_key`.
+    """
+    try:
+        return await asyncio.to_thread(
+            s3_client.generate_presigned_post,
+            S3_BUCKET_NAME,
+            s3_file_key,
+            Fields={"Content-Type": "application/pdf"},
+            Conditions=[
+                {"Content-Type": "application/pdf"},
+                ["content-length-range", 1, max_bytes],
+            ],
+            ExpiresIn=expires_in,
+        )
+    except Exception as e:
+        raise Exception(f"Failed to generate presigned upload: {str(e)}")
+
+
+async def download_s3_object_to_file(s3_file_key, fileobj):
+    """Streams an S3 object into a local file object, chunk by chunk."""
+    await asyncio.to_thread(
+        s3_client.download_fileobj, S3_BUCKET_NAME, s3_file_key, fileobj
+    )
+
+
+async def move_s3_object(source_key, destination_key):
+    """Server-side copy of an S3 object to a new key, then delete the source."""
+    await asyncio.to_thread(
+        s3_client.copy,
+        {"Bucket": S3_BUCKET_NAME, "Key": source_key},
+        S3_BUCKET_NAME,
+        destination_key,
+    )
+    await delete_s3_object(source_key)
+
+
+async def delete_s3_object(s3_file_key):
+    """Deletes an S3 object by key."""
+    await asyncio.to_thread(
+        s3_client.delete_object, Bucket=S3_BUCKET_NAME, Key=s3_file_key
+    )
+
+
 async def get_pdf_url_from_s3(paper_id, pdf_url, expires_in=3600):
     """
     Returns a presigned S3 URL for the PDF.
@@ -0,0 +1,72 @@
+"""
+Paper search backed by MongoDB indexes.
+
+Each paper carries two derived fields:
+  - title_terms: lower-cased title words, multikey-indexed so type-ahead
+    can use an anchored regex (an index range scan).
+  - search_terms: the distinct words of the extracted text, covered together
+    with the title by a weighted text index for ranked full-text search.
+"""
+import re
+from llm_research_assistant.db import papers_collection
+
+MAX_SEARCH_TERMS = 20000  # keeps papers well below the 16 MB document limit
+WORD_RE = re.compile(r"\w+")
+
+# Everything a search result needs, never the (large) search_terms
+SEARCH_PROJECTION = {"title": 1, "pdf_url": 1, "shared": 1, "owner_id": 1}
+
+
+def tokenize(text):
+    """Split text into distinct lower-case words, preserving first-seen order."""
+    return list(dict.fromkeys(WORD_RE.findall((text or "").lower())))
+
+
+def title_fields(title):
+    """Search fields to $set whenever a paper's title is written."""
+    return {"title_terms": tokenize(title)}
+
+
+async def index_paper_text(file_hash, text):
+    """Attach extracted-text terms to every paper of a file still missing them."""
+    terms = " ".join(tokenize(text)[:MAX_SEARCH_TERMS])
+    await papers_collection.update_many(
+        {"file_hash": file_hash, "search_terms": {"$exists": False}},
+        {"$set": {"search_terms": terms}},
+    )
+
+
+def _visibility_filter(user_id):
+    """Papers the user owns, plus papers shared by anyone."""
+    return {"$or": [{"owner_id": str(user_id)}, {"shared": True}]}
+
+
+async def search_papers(user_id, query, limit=10, prefix=False):
+    """
+    Return papers visible to the user that match `query`, best first.
+
+    With prefix=True the last word is treated as incomplete and matched
+    against the start of title words (type-ahead); otherwise the query runs
+    against the text index and results are sorted by text score.
+    """
+    words = tokenize(query)
+    if not words:
+        return []
+
+    if prefix:
+        conditions = [{"title_terms": word} for word in words[:-1]]
+        conditions.append({"title_terms": {"$regex": "^" + re.escape(words[-1])}})
+        cursor = papers_collection.find(
+            {"$and": conditions + [_visibility_filter(user_id)]}, SEARCH_PROJECTION
+        ).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    cursor = (
+        papers_collection.find(
+            {"$text": {"$search": query}, **_visibility_filter(user_id)},
+            {**SEARCH_PROJECTION, "score": {"$meta": "textScore"}},
+        )
+        .sort([("score", {"$meta": "textScore"})])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
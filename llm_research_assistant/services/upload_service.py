@@ -0,0 +1,128 @@
+"""
+Direct-to-S3 uploads: the client PUTs the PDF to a staging key with a
+presigned POST, and the server later hashes, validates and moves the object
+to its content-addressed key. PDF bytes never pass through a request.
+
+Finalizing streams the object to a local temp file, so it runs only in
+separate upload worker processes, which claim completed uploads from the
+uploads collection under a lease, and never in the API. Run at least one
+next to the API, or completed uploads stay "processing":
+
+    python -m llm_research_assistant.services.upload_service
+
+Staging objects are normally removed once processed; a bucket lifecycle
+rule on the `staging/` prefix should clean up abandoned ones.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+from llm_research_assistant.config import settings
+from llm_research_assistant.db import create_indexes
+from llm_research_assistant.services.extraction_service import (
+    extract_pdf_text_in_background,
+    get_executor,
+    read_document_info,
+)
+from llm_research_assistant.services.mongo_service import (
+    claim_processing_upload,
+    get_blob,
+    create_blob,
+    store_paper_metadata,
+    update_upload,
+)
+from llm_research_assistant.services.s3_service import (
+    download_s3_object_to_file,
+    move_s3_object,
+    delete_s3_object,
+    get_s3_url,
+)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def hash_file(path):
+    """SHA256 of a local file, read in fixed-size chunks."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+async def finalize_upload(upload):
+    """
+    Hash, validate and store a staged upload, recording the outcome on the
+    upload slot ("done" with paper_id, or "failed" with error).
+    """
+    upload_id = upload["_id"]
+    staging_key = upload["staging_key"]
+    fd, path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        # Stream the object to disk; it is never held in memory as a whole
+        with os.fdopen(fd, "wb") as f:
+            await download_s3_object_to_file(staging_key, f)
+
+        file_hash = await asyncio.to_thread(hash_file, path)
+
+        loop = asyncio.get_running_loop()
+        try:
+            page_count, _ = await loop.run_in_executor(
+                get_executor(), read_document_info, path
+            )
+        except Exception:
+            page_count = 0
+        if page_count < 1:
+            await delete_s3_object(staging_key)
+            await update_upload(
+                upload_id, {"status": "failed", "error": "Corrupt or unreadable PDF."}
+            )
+            return
+
+        blob = await get_blob(file_hash)
+        if blob:
+            pdf_url = blob["pdf_url"]
+            await delete_s3_object(staging_key)
+        else:
+            s3_file_key = f"papers/{file_hash}/{upload['filename']}"
+            await move_s3_object(staging_key, s3_file_key)
+            pdf_url = get_s3_url(s3_file_key)
+            await create_blob(file_hash, pdf_url, s3_file_key)
+
+        paper_id = await store_paper_metadata(
+            upload["filename"], pdf_url, upload["owner_id"], file_hash
+        )
+        await update_upload(
+            upload_id,
+            {"status": "done", "paper_id": paper_id, "file_hash": file_hash},
+        )
+
+        await extract_pdf_text_in_background(file_hash, path)
+    except Exception as e:
+        print(f"Error finalizing upload {upload_id}: {str(e)}")
+        await update_upload(upload_id, {"status": "failed", "error": str(e)})
+    finally:
+        os.remove(path)
+
+
+async def run_upload_worker():
+    """Finalize claimed uploads one at a time, forever."""
+    while True:
+        try:
+            upload = await claim_processing_upload(settings.UPLOAD_LEASE_SECONDS)
+        except Exception as e:
+            print(f"Upload worker error: {str(e)}")
+            upload = None
+        if upload is None:
+            await asyncio.sleep(settings.UPLOAD_POLL_SECONDS)
+            continue
+        await finalize_upload(upload)
+
+
+async def main():
+    await create_indexes()
+    await asyncio.gather(*(run_upload_worker() for _ in range(settings.UPLOAD_WORKERS)))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
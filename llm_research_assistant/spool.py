@@ -0,0 +1,54 @@
+"""
+A write-once spool for file contents of unknown size.
+
+Data is kept in memory up to `max_size` bytes and moved to a named temporary
+file beyond that, so large files never sit in memory as a whole and can
+still be opened by path (e.g. by the PDF extraction worker processes).
+"""
+import io
+import os
+import tempfile
+
+
+class SpooledFile:
+    def __init__(self, max_size: int, suffix: str = ".pdf"):
+        self.max_size = max_size
+        self.suffix = suffix
+        self.size = 0
+        self.path = None
+        self._file = io.BytesIO()
+
+    def write(self, data: bytes):
+        if self.path is None and self.size + len(data) > self.max_size:
+            # Roll over to disk, carrying over what was buffered so far
+            fd, self.path = tempfile.mkstemp(suffix=self.suffix)
+            disk_file = os.fdopen(fd, "w+b")
+            disk_file.write(self._file.getvalue())
+            self._file = disk_file
+        self._file.write(data)
+        self.size += len(data)
+
+    def file(self):
+        """The underlying file object, rewound for reading."""
+        self._file.flush()
+        self._file.seek(0)
+        return self._file
+
+    def source(self):
+        """The contents as bytes while in memory, otherwise the file's path."""
+        if self.path is None:
+            return self._file.getvalue()
+        self._file.flush()
+        return self.path
+
+    def close(self):
+        self._file.close()
+        if self.path is not None:
+            os.remove(self.path)
+            self.path = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
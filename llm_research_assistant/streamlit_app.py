@@ -32,6 +32,31 @@ def logout():
     st.rerun()
 
 
+# ----------------------------
+# Chat History Helpers
+# ----------------------------
+def fetch_chat_history(chat_data: dict, headers: dict):
+    """
+    Full history of a chat: GET /chats/{id} only returns the latest messages,
+    so older ones are paged backwards from /chats/{id}/messages.
+    """
+    history = chat_data.get("message_chain", [])
+    before = chat_data.get("first_seq", 0)
+    while before > 0:
+        resp = requests.get(
+            f"{API_BASE_URL}/chats/{chat_data['id']}/messages",
+            headers=headers,
+            params={"before": before, "limit": 200},
+        )
+        if resp.status_code != 200:
+            st.error("Failed to load older messages.")
+            break
+        page = resp.json()
+        history = page["messages"] + history
+        before = page["first_seq"] if page["has_more"] else 0
+    return history
+
+
 # ----------------------------
 # Chat Title Generation Helpers
 # ----------------------------
@@ -61,9 +86,8 @@ def generate_chat_title(first_message: str) -> str:
 def update_chat_title(chat_id: str, new_title: str, headers: dict):
     """
     Update the chat title on the backend.
-    Assumes the update endpoint accepts a "name" field.
     """
-    payload = {"name": new_title}
+    payload = {"title": new_title}
     resp = requests.put(
         f"{API_BASE_URL}/chats/{chat_id}", headers=headers, json=payload
     )
@@ -174,7 +198,7 @@ def main():
 
         # Display each chat as a styled entry with a delete widget.
         for chat in chats:
-            chat_name = chat.get("name") or f"Chat {chat.get('id')}"
+            chat_name = chat.get("title") or f"Chat {chat.get('id')}"
             st.markdown('<div class="chat-entry">', unsafe_allow_html=True)
             col1, col2 = st.columns([4, 1])
             with col1:
@@ -211,8 +235,8 @@ def main():
         )
         if chat_detail_resp.status_code == 200:
             chat_data = chat_detail_resp.json()
-            chat_history = chat_data.get("message_chain", [])
-            chat_name = chat_data.get("name", "New Chat")
+            chat_history = fetch_chat_history(chat_data, headers)
+            chat_name = chat_data.get("title") or "New Chat"
         else:
             st.error("Failed to load chat conversation.")
             chat_history = []
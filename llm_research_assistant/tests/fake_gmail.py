@@ -0,0 +1,153 @@
+"""
+In-memory stand-in for the googleapiclient Gmail service, covering the calls
+the ingestion path makes: users.getProfile, users.messages.list/get,
+users.history.list and batch requests. Setting `quota_error` makes every
+request fail with it, like a rate-limited mailbox or project.
+"""
+import json
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+def http_error(status, reason, retry_after=None):
+    """An HttpError shaped like the Gmail API's JSON error responses."""
+    headers = {"status": str(status)}
+    if retry_after is not None:
+        headers["retry-after"] = str(retry_after)
+    content = {"error": {"code": status, "errors": [{"reason": reason}]}}
+    return HttpError(httplib2.Response(headers), json.dumps(content).encode())
+
+
+def fake_message(msg_id, sender, subject, pdf_filename=None):
+    """A message in the format=full shape get_messages_metadata asks for."""
+    parts = []
+    if pdf_filename:
+        parts.append(
+            {
+                "partId": "1",
+                "mimeType": "application/pdf",
+                "filename": pdf_filename,
+                "body": {"attachmentId": f"att-{msg_id}", "size": 1024},
+            }
+        )
+    return {
+        "id": msg_id,
+        "payload": {
+            "headers": [
+                {"name": "From", "value": sender},
+                {"name": "Subject", "value": subject},
+            ],
+            "parts": parts,
+        },
+    }
+
+
+class FakeRequest:
+    def __init__(self, service, result):
+        self.service = service
+        self.result = result
+
+    def execute(self, http=None):
+        self.service.requests += 1
+        if self.service.quota_error is not None:
+            raise self.service.quota_error
+        return self.result()
+
+
+class FakeBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        for request_id, request in self.requests:
+            try:
+                response = request.execute()
+            except HttpError as e:
+                self.callback(request_id, None, e)
+            else:
+                self.callback(request_id, response, None)
+
+
+class FakeMessages:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, q=None, maxResults=100, pageToken=None, **kwargs):
+        ids = [{"id": msg_id} for msg_id in reversed(self.service.messages)]
+
+        def result():
+            return {"messages": ids[:maxResults]} if ids else {}
+
+        return FakeRequest(self.service, result)
+
+    def get(self, userId, id, **kwargs):
+        def result():
+            if id not in self.service.messages:
+                raise http_error(404, "notFound")
+            return self.service.messages[id]
+
+        return FakeRequest(self.service, result)
+
+
+class FakeHistory:
+    def __init__(self, service):
+        self.service = service
+
+    def list(self, userId, startHistoryId, pageToken=None, **kwargs):
+        def result():
+            added = [
+                {"messagesAdded": [{"message": {"id": msg_id}}]}
+                for history_id, msg_id in self.service.history
+                if history_id > int(startHistoryId)
+            ]
+            return {"history": added, "historyId": str(self.service.history_id)}
+
+        return FakeRequest(self.service, result)
+
+
+class FakeUsers:
+    def __init__(self, service):
+        self.service = service
+
+    def getProfile(self, userId, **kwargs):
+        def result():
+            return {
+                "emailAddress": self.service.email_address,
+                "historyId": str(self.service.history_id),
+            }
+
+        return FakeRequest(self.service, result)
+
+    def messages(self):
+        return FakeMessages(self.service)
+
+    def history(self):
+        return FakeHistory(self.service)
+
+
+class FakeGmailService:
+    """A mailbox whose messages are added with add_message(), oldest first."""
+
+    def __init__(self, email_address="reader@example.edu", quota_error=None):
+        self.email_address = email_address
+        self.quota_error = quota_error
+        self.messages = {}
+        self.history = []  # (history_id, message id) per added message
+        self.history_id = 1000
+        self.requests = 0
+
+    def add_message(self, message):
+        self.history_id += 1
+        self.messages[message["id"]] = message
+        self.history.append((self.history_id, message["id"]))
+
+    def users(self):
+        return FakeUsers(self)
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
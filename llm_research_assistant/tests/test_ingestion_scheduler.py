@@ -0,0 +1,194 @@
+"""
+IngestionScheduler driven through EmailService.sync_papers against a fake
+Gmail service, with the email_ingestion documents kept in memory.
+"""
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+from llm_research_assistant.config import settings
+from llm_research_assistant.services import email_service, ingestion_scheduler
+from llm_research_assistant.services.email_service import EmailService
+from llm_research_assistant.services.ingestion_scheduler import IngestionScheduler
+from llm_research_assistant.tests.fake_gmail import (
+    FakeGmailService,
+    fake_message,
+    http_error,
+)
+
+
+@pytest.fixture
+def accounts(monkeypatch):
+    """email_ingestion documents by user id, behind the Mongo helpers used."""
+    docs = {}
+
+    async def claim_due_email_ingestion(lease_seconds):
+        now = datetime.utcnow()
+        due = [
+            doc
+            for doc in docs.values()
+            if doc.get("next_run_at") is None or doc["next_run_at"] <= now
+        ]
+        if not due:
+            return None
+        doc = min(due, key=lambda doc: doc.get("next_run_at") or datetime.min)
+        doc["next_run_at"] = now + timedelta(seconds=lease_seconds)
+        return dict(doc)
+
+    async def record_email_ingestion_run(
+        user_id, status, next_run_at, error=None, stats=None
+    ):
+        doc = docs[user_id]
+        doc["next_run_at"] = next_run_at
+        doc["last_status"] = status
+        doc["runs"] = doc.get("runs", 0) + 1
+        if status == "ok":
+            doc["consecutive_failures"] = 0
+        else:
+            doc["consecutive_failures"] = doc.get("consecutive_failures", 0) + 1
+
+    async def get_email_ingestion(user_id):
+        return docs.get(user_id)
+
+    async def update_email_sync_state(user_id, history_id):
+        docs[user_id]["history_id"] = history_id
+
+    async def filter_new_attachments(user_id, candidates):
+        return [item for _, _, item in candidates]
+
+    async def failed_attachments(user_id, limit):
+        return []
+
+    monkeypatch.setattr(
+        ingestion_scheduler, "claim_due_email_ingestion", claim_due_email_ingestion
+    )
+    monkeypatch.setattr(
+        ingestion_scheduler, "record_email_ingestion_run", record_email_ingestion_run
+    )
+    monkeypatch.setattr(email_service, "get_email_ingestion", get_email_ingestion)
+    monkeypatch.setattr(
+        email_service, "update_email_sync_state", update_email_sync_state
+    )
+    monkeypatch.setattr(email_service, "filter_new_attachments", filter_new_attachments)
+    monkeypatch.setattr(email_service, "failed_attachments", failed_attachments)
+    return docs
+
+
+def add_account(accounts, user_id, gmail):
+    accounts[user_id] = {
+        "user_id": user_id,
+        "connected_email": gmail.email_address,
+        "next_run_at": None,
+        "consecutive_failures": 0,
+    }
+
+
+def connect_to(mailboxes):
+    """A scheduler connector handing EmailService the fake Gmail services."""
+
+    async def connect(email_ingestion):
+        service = EmailService(
+            email_ingestion["user_id"], email_ingestion["connected_email"]
+        )
+        service.service = mailboxes[email_ingestion["user_id"]]
+        return service
+
+    return connect
+
+
+def newsletter_mailbox():
+    gmail = FakeGmailService()
+    gmail.add_message(fake_message("m1", "News <news@shop.example.com>", "Sale"))
+    return gmail
+
+
+def test_user_quota_error_backs_off_the_account(accounts):
+    gmail = FakeGmailService(quota_error=http_error(429, "userRateLimitExceeded"))
+    add_account(accounts, "u1", gmail)
+    scheduler = IngestionScheduler(workers=1, connect=connect_to({"u1": gmail}))
+
+    async def run():
+        await scheduler.run_once(
+            await ingestion_scheduler.claim_due_email_ingestion(60)
+        )
+
+    started = datetime.utcnow()
+    asyncio.run(run())
+
+    doc = accounts["u1"]
+    assert doc["last_status"] == "rate_limited"
+    assert doc["consecutive_failures"] == 1
+    # Jittered between half and all of the base backoff
+    assert doc["next_run_at"] >= started + timedelta(
+        seconds=settings.INGEST_BACKOFF_SECONDS * 0.5
+    )
+    assert "history_id" not in doc
+    # A per-user quota does not pause the other accounts
+    assert scheduler._paused_until == 0
+
+
+def test_project_quota_error_pauses_workers(accounts):
+    gmail = FakeGmailService(
+        quota_error=http_error(403, "rateLimitExceeded", retry_after=7200)
+    )
+    add_account(accounts, "u1", gmail)
+    scheduler = IngestionScheduler(workers=1, connect=connect_to({"u1": gmail}))
+
+    async def run():
+        await scheduler.run_once(
+            await ingestion_scheduler.claim_due_email_ingestion(60)
+        )
+        return scheduler._paused_until - asyncio.get_running_loop().time()
+
+    started = datetime.utcnow()
+    pause = asyncio.run(run())
+
+    assert accounts["u1"]["last_status"] == "rate_limited"
+    assert accounts["u1"]["next_run_at"] >= started + timedelta(seconds=7200)
+    assert pause > 0
+
+
+def test_successful_sync_advances_next_run_at(accounts):
+    gmail = newsletter_mailbox()
+    add_account(accounts, "u1", gmail)
+    scheduler = IngestionScheduler(workers=1, connect=connect_to({"u1": gmail}))
+
+    async def run():
+        await scheduler.run_once(
+            await ingestion_scheduler.claim_due_email_ingestion(60)
+        )
+
+    started = datetime.utcnow()
+    asyncio.run(run())
+
+    doc = accounts["u1"]
+    assert doc["last_status"] == "ok"
+    assert doc["next_run_at"] >= started + timedelta(
+        seconds=settings.INGEST_SYNC_INTERVAL_SECONDS
+    )
+    # The checkpoint is the mailbox's historyId, read before the full scan
+    assert doc["history_id"] == str(gmail.history_id)
+
+
+def test_workers_take_turns_between_accounts(accounts, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_SYNC_INTERVAL_SECONDS", 0)
+    mailboxes = {}
+    for user_id in ("u1", "u2", "u3"):
+        mailboxes[user_id] = newsletter_mailbox()
+        add_account(accounts, user_id, mailboxes[user_id])
+    # A busy mailbox must not keep the others waiting
+    for i in range(50):
+        mailboxes["u1"].add_message(
+            fake_message(f"busy{i}", "News <news@shop.example.com>", "Sale")
+        )
+    scheduler = IngestionScheduler(workers=1, connect=connect_to(mailboxes))
+
+    async def run():
+        scheduler.start()
+        await asyncio.sleep(0.5)
+        await scheduler.stop()
+
+    asyncio.run(run())
+
+    runs = [accounts[user_id].get("runs", 0) for user_id in ("u1", "u2", "u3")]
+    assert min(runs) >= 1
+    assert max(runs) - min(runs) <= 1
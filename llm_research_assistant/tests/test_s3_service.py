@@ -0,0 +1,54 @@
+"""upload_pdf_to_s3 with the file types the routes and ingestion pass it."""
+import asyncio
+from io import BytesIO
+import pytest
+from starlette.datastructures import UploadFile
+from llm_research_assistant.services import s3_service
+
+PDF = b"%PDF-1.4 test body"
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.bodies = {}
+
+    def upload_fileobj(self, fileobj, bucket, key):
+        self.bodies[key] = fileobj.read()
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    client = FakeS3Client()
+    blobs = {}
+
+    async def get_blob(file_hash):
+        return blobs.get(file_hash)
+
+    async def create_blob(file_hash, pdf_url, s3_key):
+        blobs[file_hash] = {"pdf_url": pdf_url, "s3_key": s3_key}
+
+    monkeypatch.setattr(s3_service, "s3_client", client)
+    monkeypatch.setattr(s3_service, "get_blob", get_blob)
+    monkeypatch.setattr(s3_service, "create_blob", create_blob)
+    return client
+
+
+def test_upload_starlette_upload_file(s3):
+    upload = UploadFile(BytesIO(PDF), filename="paper.pdf")
+
+    async def run():
+        await upload.read()  # consumed by validation, as in the routes
+        return await s3_service.upload_pdf_to_s3(upload, "u1", "paper.pdf", "h1")
+
+    pdf_url = asyncio.run(run())
+
+    assert s3.bodies == {"papers/h1/paper.pdf": PDF}
+    assert pdf_url.endswith("/papers/h1/paper.pdf")
+
+
+def test_upload_bytes_and_existing_blob(s3):
+    pdf_url = asyncio.run(s3_service.upload_pdf_to_s3(PDF, "u1", "a.pdf", "h2"))
+    again = asyncio.run(s3_service.upload_pdf_to_s3(PDF, "u2", "b.pdf", "h2"))
+
+    assert s3.bodies == {"papers/h2/a.pdf": PDF}
+    assert again == pdf_url
@@ -0,0 +1,84 @@
+"""
+Micro-benchmark of the academic email classifier.
+
+Classifies synthetic From/Subject headers with the compiled engine
+(services/classifier.py) and with the per-message list scans it replaced,
+checks that both accept the same emails and prints the timings.
+
+    python -m llm_research_assistant.util.benchmark_classifier [count]
+"""
+import random
+import re
+import sys
+import time
+from llm_research_assistant.services.classifier import (
+    DEFAULT_ALLOWED_SENDERS,
+    DEFAULT_KEYWORDS,
+    DEFAULT_UNIVERSITY_DOMAINS,
+    AcademicClassifier,
+)
+
+_OTHER_DOMAINS = ["gmail.com", "shop.example.com", "news.example.org", "bank.com"]
+_SUBJECT_WORDS = ["weekly", "update", "your", "order", "invoice", "meeting", "notes"]
+
+
+def synthetic_headers(count, seed=0):
+    """Header records with a realistic mix of academic and other senders."""
+    rng = random.Random(seed)
+    sender_domains = (
+        DEFAULT_ALLOWED_SENDERS
+        + ["cs.stanford.edu", "math.ox.ac.uk", "iitb.ac.in"]
+        + _OTHER_DOMAINS * 4
+    )
+    records = []
+    for i in range(count):
+        words = rng.sample(_SUBJECT_WORDS, 4)
+        if rng.random() < 0.3:
+            words.insert(rng.randrange(5), rng.choice(DEFAULT_KEYWORDS))
+        records.append(
+            {
+                "from": f"Sender {i} <user{i}@{rng.choice(sender_domains)}>",
+                "subject": " ".join(words).title(),
+                "has_pdf": rng.random() < 0.5,
+            }
+        )
+    return records
+
+
+def legacy_classify(record):
+    """The previous per-message checks, kept as the benchmark baseline."""
+    match = re.search(r"@([\w.-]+)", record["from"])
+    sender_domain = match.group(1) if match else ""
+    is_academic_sender = any(
+        domain in sender_domain for domain in DEFAULT_ALLOWED_SENDERS
+    ) or any(sender_domain.endswith(edu) for edu in DEFAULT_UNIVERSITY_DOMAINS)
+    is_research_related = any(
+        keyword.lower() in record["subject"].lower() for keyword in DEFAULT_KEYWORDS
+    )
+    return is_academic_sender and is_research_related and record["has_pdf"]
+
+
+def main(count=100_000):
+    records = synthetic_headers(count)
+    classifier = AcademicClassifier(
+        DEFAULT_ALLOWED_SENDERS, DEFAULT_UNIVERSITY_DOMAINS, DEFAULT_KEYWORDS
+    )
+
+    start = time.perf_counter()
+    legacy = [legacy_classify(record) for record in records]
+    legacy_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compiled = [is_academic for is_academic, _ in classifier.classify_batch(records)]
+    compiled_seconds = time.perf_counter() - start
+
+    mismatches = sum(a != b for a, b in zip(legacy, compiled))
+    print(f"{count} headers, {sum(compiled)} academic, {mismatches} mismatches")
+    print(f"legacy   {legacy_seconds * 1000:8.1f} ms")
+    print(f"compiled {compiled_seconds * 1000:8.1f} ms (with match reasons)")
+    print(f"speedup  {legacy_seconds / compiled_seconds:8.2f}x")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000))
@@ -0,0 +1,139 @@
+"""
+Verify that every hot query is served by an index.
+
+Applies the index registry from db.py, runs explain() on each query in
+HOT_QUERIES and exits non-zero if any winning plan contains a COLLSCAN.
+
+    python -m llm_research_assistant.util.check_indexes
+"""
+import asyncio
+import sys
+from datetime import datetime
+from bson import ObjectId
+from llm_research_assistant.db import db, create_indexes
+
+_SAMPLE_ID = ObjectId()
+_SAMPLE_HASH = "0" * 64
+
+# (description, collection, filter, sort) mirroring the queries in routes/
+# and services/; sample values only need the right types.
+HOT_QUERIES = [
+    ("login/register by email", "users", {"email": "a@b.edu"}, None),
+    ("current user by _id", "users", {"_id": _SAMPLE_ID}, None),
+    ("list users page", "users", {"_id": {"$gt": _SAMPLE_ID}}, [("_id", 1)]),
+    (
+        "list papers page by owner",
+        "papers",
+        {"owner_id": str(_SAMPLE_ID), "_id": {"$gt": _SAMPLE_ID}},
+        [("_id", 1)],
+    ),
+    (
+        "paper dedupe by owner and hash",
+        "papers",
+        {"owner_id": str(_SAMPLE_ID), "file_hash": _SAMPLE_HASH},
+        None,
+    ),
+    ("papers by file_hash", "papers", {"file_hash": _SAMPLE_HASH}, None),
+    (
+        "paper title type-ahead",
+        "papers",
+        {"title_terms": {"$regex": "^neur"}},
+        None,
+    ),
+    ("paper full-text search", "papers", {"$text": {"$search": "neural"}}, None),
+    (
+        "list chat summaries by owner",
+        "chats",
+        {"owner_id": str(_SAMPLE_ID)},
+        [("updated_at", -1), ("_id", -1)],
+    ),
+    (
+        "export chats by owner",
+        "chats",
+        {"owner_id": str(_SAMPLE_ID), "_id": {"$gte": _SAMPLE_ID}},
+        [("_id", 1)],
+    ),
+    (
+        "chat history by sequence",
+        "chat_messages",
+        {"chat_id": _SAMPLE_ID, "seq": {"$gte": 0}},
+        [("seq", 1)],
+    ),
+    ("email ingestion by user", "email_ingestion", {"user_id": _SAMPLE_ID}, None),
+    (
+        "next email ingestion due",
+        "email_ingestion",
+        {"next_run_at": {"$not": {"$gt": datetime.utcnow()}}},
+        [("next_run_at", 1)],
+    ),
+    (
+        "ingested attachments by message",
+        "ingestion_ledger",
+        {"user_id": str(_SAMPLE_ID), "message_id": {"$in": ["18c0a1b2c3d4e5f6"]}},
+        None,
+    ),
+    (
+        "ingestion ledger entries since",
+        "ingestion_ledger",
+        {"user_id": str(_SAMPLE_ID), "created_at": {"$gte": datetime.utcnow()}},
+        None,
+    ),
+    (
+        "next upload to finalize",
+        "uploads",
+        {"status": "processing", "lease_until": {"$not": {"$gt": datetime.utcnow()}}},
+        None,
+    ),
+    (
+        "failed attachments to retry",
+        "ingestion_ledger",
+        {"user_id": str(_SAMPLE_ID), "status": "failed", "attempts": {"$lt": 5}},
+        None,
+    ),
+    ("extracted text by hash", "paper_texts", {"file_hash": _SAMPLE_HASH}, None),
+    ("blob by hash", "blobs", {"_id": _SAMPLE_HASH}, None),
+    ("refresh token by hash", "refresh_tokens", {"_id": _SAMPLE_HASH}, None),
+]
+
+
+def plan_stages(plan):
+    """Yield every stage name in an explain() plan tree."""
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from plan_stages(value)
+    elif isinstance(plan, list):
+        for item in plan:
+            yield from plan_stages(item)
+
+
+async def check_query_plans():
+    """Explain each hot query; return the descriptions that scan a collection."""
+    failures = []
+    for description, collection_name, query, sort in HOT_QUERIES:
+        cursor = db[collection_name].find(query).limit(10)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        stages = set(plan_stages(winning_plan))
+        status = "COLLSCAN" if "COLLSCAN" in stages else "ok"
+        print(f"{status:8} {collection_name}: {description} {sorted(stages)}")
+        if status != "ok":
+            failures.append(description)
+    return failures
+
+
+async def main():
+    await create_indexes()
+    failures = await check_query_plans()
+    if failures:
+        print(f"{len(failures)} hot queries are not using an index.")
+        return 1
+    print("All hot queries use an index.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))